@@ -0,0 +1,865 @@
+import os
+import re
+import json
+import queue
+import pickle
+import random
+import socket
+import string
+import hashlib
+import time
+import shutil
+import resource
+import tempfile
+import multiprocessing
+from threading import Thread
+from heapq import heappush, heappop
+from itertools import product
+from collections import deque, defaultdict
+from urllib.parse import urlparse
+from configparser import ConfigParser
+from argparse import ArgumentParser
+
+import cbor
+import requests
+from nltk.stem import PorterStemmer
+
+from utils import get_urlhash
+from utils.config import Config
+from utils.replay import ReplayArchive, ReplayServer
+from utils.response import Response
+
+
+def run_crawl(config_file, cache_server, worker, threads, parse_processes, priority,
+              fetches, politeness, seed_urls, save_dir, results):
+    # one benchmark run, in its own process so memory and metrics start clean
+    from crawler import Crawler
+    from crawler.worker import Worker
+    from crawler.async_worker import AsyncWorker
+    from utils import metrics
+    import scraper
+
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    config.cache_server = cache_server
+    config.worker = worker
+    if worker == "async":
+        # threads downloads in flight on one event loop
+        config.threads_count = 1
+        config.async_tasks = threads
+    else:
+        config.threads_count = threads
+    if parse_processes is not None:
+        config.parse_processes = parse_processes
+    if seed_urls:
+        config.seed_urls = seed_urls
+    config.priority = priority
+    config.time_delay = politeness
+    config.save_file = os.path.join(save_dir, "frontier.shelve")
+    # record nothing while replaying, keep the metrics in memory only
+    config.record_file = ""
+    config.metrics_enabled = True
+    config.metrics_port = 0
+    config.metrics_snapshot_file = ""
+
+    crawler = Crawler(
+        config, True, worker_factory=AsyncWorker if worker == "async" else Worker)
+    # workers idle for a while before they stop, so time the crawl up to
+    # the last page downloaded
+    # and note the unique pages found by the time fetches pages were downloaded
+    progress = {"pages": 0, "last": time.time(), "unique": None}
+    def watch():
+        while True:
+            pages = metrics.get_count("crawler_pages_downloaded_total")
+            if pages != progress["pages"]:
+                progress["pages"], progress["last"] = pages, time.time()
+            if fetches and progress["unique"] is None and pages >= fetches:
+                progress["unique"] = scraper.stats.get_total_pages()
+            time.sleep(0.05)
+    Thread(target=watch, daemon=True).start()
+
+    start = time.time()
+    crawler.start()
+    summary = metrics.snapshot()
+    elapsed = max(progress["last"] - start, 1e-9)
+    pages = summary["counters"].get("crawler_pages_downloaded_total", 0)
+    stages = {
+        name.split('"')[1]: histogram["sum"] / histogram["count"]
+        for name, histogram in summary["histograms"].items()
+        if name.startswith("crawler_stage_seconds") and histogram["count"]}
+    lock_waits = {
+        name.split('"')[1]: histogram["sum"]
+        for name, histogram in summary["histograms"].items()
+        if name.startswith("crawler_lock_wait_seconds")}
+    results.put({
+        "worker": worker, "threads": threads, "parse_processes": config.parse_processes,
+        "priority": priority, "pages": pages, "seconds": elapsed,
+        "unique_pages": scraper.stats.get_total_pages(),
+        "unique_at_fetches": progress["unique"],
+        "pages_per_second": pages / elapsed,
+        # kilobytes on linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "stage_seconds": stages, "lock_wait_seconds": lock_waits})
+
+
+# the implementations the current ones replaced, for the micro benchmarks
+# and the parity tests in tests/
+
+def baseline_simhash(tokens, b=64):
+    v = [0] * b
+    for token in tokens:
+        token_hash = int(hashlib.md5(token.encode('utf-8')).hexdigest(), 16)
+        for i in range(b):
+            if token_hash & (1 << i):
+                v[i] += 1
+            else:
+                v[i] -= 1
+    fingerprint = 0
+    for i in range(b):
+        if v[i] >= 0:
+            fingerprint |= 1 << i
+    return fingerprint
+
+
+BASELINE_IGNORE = [
+    "mediamanager.php", "eppstein/pix", "isg.ics.uci.edu/events/", "share=facebook",
+    "share=twitter", "login", "redirect", "grape.ics.uci.edu/wiki/public/timeline",
+    "grape.ics.uci.edu/wiki/asterix/timeline", "ical=", "fano.ics.uci.edu/ca/rules",
+    "week", "month", "year", "calendar"]
+BASELINE_EXTENSIONS = re.compile(
+    r".*\.(css|js|bmp|gif|jpe?g|ico"
+    + r"|png|tiff?|mid|mp2|mp3|mp4"
+    + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
+    + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
+    + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
+    + r"|epub|dll|cnf|tgz|sha1"
+    + r"|thmx|mso|arff|rtf|jar|csv"
+    + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$")
+
+
+def baseline_is_valid(url):
+    # the hard-coded rules url_rules.ini replaced, "year" included
+    parsed = urlparse(url)
+    if parsed.scheme not in set(["http", "https"]):
+        return False
+    netloc = parsed.netloc.lower()
+    path = parsed.path.lower()
+    query = parsed.query.lower()
+    if "grape.ics.uci.edu" in netloc and "action=diff&version=" in query:
+        return False
+    full_url = f"{netloc}{path}{query}".lower()
+    for item in BASELINE_IGNORE:
+        if item in full_url:
+            return False
+    if not netloc.endswith((".ics.uci.edu", ".cs.uci.edu", ".informatics.uci.edu", ".stat.uci.edu")):
+        return False
+    return not BASELINE_EXTENSIONS.match(parsed.path.lower())
+
+
+def bench_links(count, rng):
+    ''' Links like the ones found on crawled pages, mixing the cases each
+    url rule decides: schemes, hosts in and out of the allowed domains,
+    skipped substrings, extensions and per host query rules. '''
+    schemes = ["https", "http", "HTTPS", "ftp", "mailto", "javascript"]
+    hosts = ["www.ics.uci.edu", "ICS.UCI.EDU", "vision.ics.uci.edu", "grape.ics.uci.edu",
+             "www.cs.uci.edu", "www.informatics.uci.edu", "www.stat.uci.edu", "uci.edu",
+             "ics.uci.edu.example.com", "example.com", "fano.ics.uci.edu", "isg.ics.uci.edu",
+             "www.ics.uci.edu:8080", "user:pass@www.ics.uci.edu"]
+    segments = ["", "about", "~eppstein", "eppstein", "pix", "events", "wiki", "public",
+                "timeline", "ca", "rules", "Login", "redirect", "calendar", "weekly", "2019",
+                "yearbook", "month-view", "mediamanager.php", "doku.php", "people", "a.b"]
+    files = ["", "index.html", "paper.PDF", "slides.pptx", "data.tar.gz", "photo.jpeg",
+             "script.js", "page.php", "notes.txt", "x.names", "archive.zip/", ".pdf",
+             "file.tiff", "file.tif", "style.CSS", "report.docx", "dataset.csv"]
+    queries = ["", "", "id=1", "action=diff&version=3", "do=edit", "ical=1", "share=facebook",
+               "share=twitter", "page=2&sort=year", "tribe-bar-date=2020-01", "q=Login"]
+    links = []
+    for _ in range(count):
+        path = "/".join(rng.choice(segments) for _ in range(rng.randint(0, 3)))
+        url = f"{rng.choice(schemes)}://{rng.choice(hosts)}/{path}"
+        url = f"{url.rstrip('/')}/{rng.choice(files)}"
+        query = rng.choice(queries)
+        if query:
+            url += "?" + query
+        if rng.random() < 0.1:
+            url += "#section"
+        links.append(url)
+    return links
+
+
+def benchmark_filter(args):
+    ''' scraper.is_valid (a UrlFilter built from URL_RULES) against the
+    hard-coded rules it replaced, per url and with filter() on a batch. '''
+    from utils.url_filter import UrlFilter
+    cparser = ConfigParser()
+    cparser.read(args.config_file)
+    url_filter = UrlFilter.from_file(Config(cparser).url_rules)
+    urls = bench_links(args.filter_urls, random.Random(0))
+    run = {"urls": len(urls),
+           "baseline_ns": best_time(baseline_is_valid, urls) * 1e9,
+           "is_valid_ns": best_time(url_filter.is_valid, urls) * 1e9,
+           "filter_ns": best_time(url_filter.filter, [urls]) / len(urls) * 1e9,
+           "valid": len(url_filter.filter(urls)) / len(urls)}
+    print(f"{len(urls)} urls, {run['valid']:.0%} valid: {run['baseline_ns']:.0f}ns per url "
+          f"before, {run['is_valid_ns']:.0f}ns now, {run['filter_ns']:.0f}ns with filter()")
+    return [run]
+
+
+baseline_stemmer = PorterStemmer()
+
+
+def baseline_tokenize(text):
+    # parse_text, and the word count extract_next_links took apart
+    from scraper import STOPWORDS
+    only_words = re.sub(r'[^\w\s]', '', text)
+    tokens = only_words.lower().split()
+    remove_stopwords = [t for t in tokens if t not in STOPWORDS and len(t) > 1]
+    return [baseline_stemmer.stem(t) for t in remove_stopwords], len(re.findall(r'\w+', text))
+
+
+def page_texts(path):
+    ''' Visible text of the html pages in directory path, or of the pages
+    in the archive at path. '''
+    from utils.extract import lxml_extract
+    contents = []
+    if os.path.isdir(path):
+        for directory, _, names in os.walk(path):
+            for name in sorted(names):
+                if name.endswith((".html", ".htm")):
+                    with open(os.path.join(directory, name), "rb") as f:
+                        contents.append(f.read())
+    else:
+        archive = ReplayArchive(path)
+        for url in list(archive.index):
+            status, body = archive.get(url)
+            reply = cbor.loads(body) if body else {}
+            if reply.get("response"):
+                contents.append(pickle.loads(reply["response"]).content)
+        archive.close()
+    texts = (lxml_extract(content)[0] for content in contents if content)
+    return [text for text in texts if text]
+
+
+def benchmark_tokenize(args):
+    ''' scraper.tokenize against parse_text and the word count it
+    replaced, on the text of real pages: once with an empty stem cache,
+    then with the cache filled by the pages before. '''
+    import scraper
+    texts = page_texts(args.tokenize_pages)
+    if not texts:
+        print(f"No pages with text in {args.tokenize_pages}.")
+        return []
+    words = sum(len(text.split()) for text in texts)
+    identical = all(scraper.tokenize(text.split()) == baseline_tokenize(text) for text in texts)
+    def tokenize(text):
+        return scraper.tokenize(text.split())
+    baseline = best_time(baseline_tokenize, texts)
+    scraper.stem.cache_clear()
+    cold = best_time(tokenize, texts, repeats=1)
+    warm = best_time(tokenize, texts)
+    run = {"pages": len(texts), "words": words, "identical": identical,
+           "baseline_ms": baseline * 1000, "cold_ms": cold * 1000, "warm_ms": warm * 1000,
+           "stem_cache": scraper.stem_cache_stats()}
+    print(f"{len(texts)} pages, {words // len(texts)} words each: {run['baseline_ms']:.2f}ms "
+          f"per page before, now {run['cold_ms']:.2f}ms with an empty stem cache and "
+          f"{run['warm_ms']:.2f}ms with a filled one, identical tokens: {identical}")
+    return [run]
+
+
+def bench_words(count, rng):
+    return [
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(2, 10)))
+        for _ in range(count)]
+
+
+def bench_tokens(count, rng, vocabulary=20000):
+    # stem-like words drawn with a Zipf-like skew, as on real pages
+    words = bench_words(vocabulary, rng)
+    weights = [1 / rank for rank in range(1, vocabulary + 1)]
+    return rng.choices(words, weights, k=count)
+
+
+def best_time(function, arguments, repeats=3):
+    # best of repeats of calling function on every argument, in seconds per call
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for argument in arguments:
+            function(argument)
+        best = min(best, (time.perf_counter() - start) / len(arguments))
+    return best
+
+
+def benchmark_simhash(args):
+    ''' scraper.simhash against the per-token loop it replaced, on pages of
+    each number of tokens. '''
+    import scraper
+    rng = random.Random(0)
+    runs = []
+    for count in (int(tokens) for tokens in args.simhash_tokens.split(",")):
+        pages = [bench_tokens(count, rng) for _ in range(10)]
+        identical = all(scraper.simhash(tokens) == baseline_simhash(tokens) for tokens in pages)
+        run = {"tokens": count, "identical": identical,
+               "baseline_ms": best_time(baseline_simhash, pages) * 1000,
+               "simhash_ms": best_time(scraper.simhash, pages) * 1000}
+        runs.append(run)
+        print(f"{count} tokens: {run['baseline_ms']:.2f}ms before, {run['simhash_ms']:.2f}ms "
+              f"now, {run['baseline_ms'] / run['simhash_ms']:.1f}x faster, identical "
+              f"fingerprints: {identical}")
+    return runs
+
+
+class BaselineScheduler(object):
+    ''' The frontier's get_tbd_url before the per-domain queues: one FIFO
+    queue, and a worker whose url's domain was fetched less than time_delay
+    ago sleeps until it may fetch it. next_url(now) returns the url and the
+    time the worker starts downloading it. '''
+    def __init__(self, urls, time_delay):
+        self.to_be_downloaded = deque(urls)
+        self.domain_last_seen = defaultdict(float)
+        self.time_delay = time_delay
+
+    def next_url(self, now):
+        if not self.to_be_downloaded:
+            return None, None
+        url = self.to_be_downloaded.popleft()
+        domain = urlparse(url).netloc
+        elapsed_time = now - self.domain_last_seen[domain]
+        if elapsed_time > self.time_delay:
+            self.domain_last_seen[domain] = now
+            return url, now
+        # the worker sleeps holding the url
+        self.domain_last_seen[domain] = now + self.time_delay - elapsed_time
+        return url, self.domain_last_seen[domain]
+
+    def complete(self, url):
+        pass
+
+
+class FakeClock(object):
+    # stands in for the time module of crawler.frontier
+    now = 0.0
+
+    @classmethod
+    def time(cls):
+        return cls.now
+
+
+class FrontierScheduler(object):
+    # the frontier's poll_tbd_url on the fake clock
+    def __init__(self, frontier):
+        self.frontier = frontier
+
+    def next_url(self, now):
+        FakeClock.now = now
+        url, wait_time = self.frontier.poll_tbd_url()
+        if url:
+            return url, now
+        return None, None if wait_time is None else now + wait_time
+
+    def complete(self, url):
+        self.frontier.mark_url_complete(url)
+
+
+def simulate(scheduler, threads, fetch_seconds):
+    ''' Runs threads workers on a fake clock until the scheduler runs out
+    of urls, each download taking fetch_seconds. Returns the fake times
+    the downloads finished at. '''
+    # (time, worker, url it finished downloading or None)
+    events = [(0.0, worker, None) for worker in range(threads)]
+    finished = []
+    while events:
+        now, worker, done = heappop(events)
+        if done:
+            scheduler.complete(done)
+            finished.append(now)
+        url, start = scheduler.next_url(now)
+        if url:
+            heappush(events, (start + fetch_seconds, worker, url))
+        elif start is not None:
+            # no domain is ready, ask again when one is
+            heappush(events, (start, worker, None))
+    return finished
+
+
+def scheduler_urls(urls, domains):
+    # urls on domains hosts, the first ones holding most of them as when
+    # a crawl starts from a few seeds, in a random discovery order
+    rng = random.Random(0)
+    weights = [1 / rank for rank in range(1, domains + 1)]
+    hosts = rng.choices(range(domains), weights, k=urls)
+    return [f"https://d{host}.ics.uci.edu/page-{i}.html" for i, host in enumerate(hosts)]
+
+
+def run_scheduler(config_file, design, threads, urls, fetch_seconds, politeness,
+                  save_dir, results):
+    # one simulated crawl, in its own process as the frontier's clock is replaced
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    config.time_delay = politeness or config.time_delay
+    queued = scheduler_urls(urls, 4)
+    if design == "baseline":
+        scheduler = BaselineScheduler(queued, config.time_delay)
+    else:
+        from crawler import frontier as frontier_module
+        from crawler.frontier import Frontier
+        import scraper
+        config.save_file = os.path.join(save_dir, "frontier.shelve")
+        config.seed_urls = []
+        # the synthetic urls all share one template
+        config.trap_max_template_urls = urls
+        frontier_module.time = FakeClock
+        scraper.configure(config, True)
+        frontier = Frontier(config, True)
+        for url in queued:
+            frontier.add_url(url)
+        scheduler = FrontierScheduler(frontier)
+    finished = simulate(scheduler, threads, fetch_seconds)
+    if design != "baseline":
+        frontier.close()
+        scraper.close()
+    # the largest domain sets when the crawl ends, the rate while every
+    # domain still has urls is what the scheduling changes
+    window = min(60.0, finished[-1])
+    results.put({
+        "design": design, "threads": threads, "urls": len(finished), "seconds": finished[-1],
+        "fetches_per_second": sum(1 for at in finished if at <= window) / window,
+        # no domain can be fetched more often than every time_delay seconds
+        "bound": min(threads / fetch_seconds, 4 / config.time_delay)})
+
+
+def benchmark_scheduler(args):
+    ''' The frontier's per-domain scheduling against the single queue it
+    replaced, on a fake clock: 2000 urls on 4 domains, downloads taking
+    --latency seconds (0.05 by default), POLITENESS or --politeness apart
+    on each domain. '''
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for threads in (int(count) for count in args.scheduler_threads.split(",")):
+        for design in ("baseline", "frontier"):
+            save_dir = tempfile.mkdtemp(prefix="benchmark-")
+            run = run_process(
+                context, run_scheduler, args.config_file, design, threads, 2000,
+                args.latency or 0.05, args.politeness, save_dir)
+            shutil.rmtree(save_dir, ignore_errors=True)
+            if run is None:
+                print(f"{design}, threads {threads}: the run failed, see Logs/.")
+                continue
+            runs.append(run)
+            print(f"{design}, threads {threads}: {run['fetches_per_second']:.2f} fetches/s "
+                  f"over the first minute (at most {run['bound']:.2f}), {run['urls']} urls "
+                  f"in {run['seconds']:.1f} fake seconds")
+    return runs
+
+
+def write_synthetic_archive(path, pages, hosts=8):
+    ''' Writes an archive of pages cache server replies for a site of
+    pages pages on hosts hosts, each with its own text and links to 8
+    others, as the cache server would send them. Returns the seed urls. '''
+    rng = random.Random(0)
+    # drawn evenly, so no two pages are near duplicates
+    words = bench_words(20000, rng)
+    archive = ReplayArchive(path)
+    def url(i):
+        return f"https://h{i % hosts}.ics.uci.edu/page-{i}"
+    for i in range(pages):
+        text = " ".join(rng.choices(words, k=300))
+        links = "".join(f'<a href="{url(rng.randrange(pages))}">more</a>' for _ in range(8))
+        resp = requests.Response()
+        resp.url = url(i)
+        resp.status_code = 200
+        resp.headers["Content-Type"] = "text/html"
+        resp._content = f"<html><body><p>{text}</p>{links}</body></html>".encode("utf-8")
+        archive.record(url(i), 200, cbor.dumps(
+            {"url": url(i), "status": 200, "response": pickle.dumps(resp)}))
+    archive.close()
+    return [url(i) for i in range(hosts)]
+
+
+def bench_url(i):
+    # urls on 2000 hosts, like a large crawl
+    return f"https://h{i % 2000}.ics.uci.edu/dept/{i % 500}/page-{i}.html"
+
+
+def restart_config(config_file, save_dir, urls):
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    config.save_file = os.path.join(save_dir, "frontier.shelve")
+    config.seen_capacity = max(config.seen_capacity, urls)
+    return config
+
+
+def build_save_file(config_file, urls, save_dir):
+    # a save file with urls discovered on 2000 hosts, every other one downloaded
+    from crawler.store import ShelveStore, LogStore
+    from utils.canonical import Canonicalizer
+    config = restart_config(config_file, save_dir, urls)
+    # keyed as the frontier keys urls, so it is loaded without keying it again
+    canonicalizer = Canonicalizer.from_file(config.url_rules)
+    with open(f"{config.save_file}.keys", "w") as f:
+        f.write(canonicalizer.digest())
+    save = (LogStore if config.frontier_store == "log" else ShelveStore)(config.save_file)
+    for i in range(urls):
+        url = canonicalizer.canonicalize(bench_url(i))
+        save.put(get_urlhash(canonicalizer.key(url)), url, i % 2 == 1)
+        if i % 100000 == 99999:
+            save.sync()
+    save.close()
+
+
+def run_restart(config_file, urls, save_dir, results):
+    # one restart from the save file in save_dir, in its own process so
+    # peak memory is its own
+    from crawler.frontier import Frontier, LogFrontier
+    config = restart_config(config_file, save_dir, urls)
+    frontier_factory = LogFrontier if config.frontier_store == "log" else Frontier
+    checkpoint = os.path.exists(f"{config.save_file}.pending")
+
+    start = time.time()
+    frontier = frontier_factory(config, False)
+    started = time.time() - start
+    frontier.get_tbd_url()
+    first_url = time.time() - start
+    if frontier.loader:
+        frontier.loader.join()
+    loaded = time.time() - start
+    results.put({
+        "urls": urls, "checkpoint": checkpoint, "started_seconds": started,
+        "first_url_seconds": first_url, "loaded_seconds": loaded,
+        "queued": frontier._queue_depth(),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024})
+    # writes the checkpoint the next run starts from
+    frontier.close()
+
+
+def run_process(context, target, *args):
+    # runs target in a new process, returns what it put in results or None
+    results = context.Queue()
+    process = context.Process(target=target, args=args + (results,))
+    process.start()
+    result = None
+    while result is None and process.is_alive():
+        try:
+            result = results.get(timeout=1)
+        except queue.Empty:
+            pass
+    process.join()
+    return result
+
+
+def run_seen(config_file, urls, exact, results):
+    ''' Adds urls urls to a seen url set sized by the SEEN_* settings (or
+    to a set of urls when exact, as the scraper kept), then looks up as
+    many new ones and as many added ones. Only set operations are timed. '''
+    from utils.seen import SeenSet
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    lookups = min(urls, 1000000)
+    # what the save file would answer for the keys the filter might have
+    stored = [True]
+    if exact:
+        seen = set()
+    else:
+        seen = SeenSet(
+            max(config.seen_capacity, urls), config.seen_error_rate, config.seen_memory,
+            contains=lambda urlhash: stored[0])
+    base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    def timed(operation, start, stop):
+        seconds = 0.0
+        for chunk_start in range(start, stop, 100000):
+            keys = [
+                bench_url(i) if exact else get_urlhash(bench_url(i))
+                for i in range(chunk_start, min(chunk_start + 100000, stop))]
+            chunk_time = time.perf_counter()
+            for key in keys:
+                operation(key)
+            seconds += time.perf_counter() - chunk_time
+        return seconds
+
+    add_seconds = timed(seen.add, 0, urls)
+    stored[0] = False
+    new_seconds = timed(seen.__contains__, urls, urls + lookups)
+    if not exact:
+        stats = seen.stats()
+    stored[0] = True
+    seen_seconds = timed(seen.__contains__, 0, lookups)
+    result = {
+        "urls": urls, "set": "exact" if exact else "bloom",
+        "add_ns": add_seconds / urls * 1e9, "new_lookup_ns": new_seconds / lookups * 1e9,
+        "seen_lookup_ns": seen_seconds / lookups * 1e9,
+        "rss_mb": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base_rss) / 1024}
+    if not exact:
+        # of the new urls, the share the save file would have been asked about
+        result.update(
+            store_lookup_rate=stats["false_positive_rate"],
+            expected_rate=stats["expected_false_positive_rate"],
+            filter_mb=stats["filter_bytes"] / 1024 / 1024)
+    results.put(result)
+
+
+def benchmark_seen(args):
+    ''' The Bloom filter seen url set against the set of urls it replaced,
+    for each number of urls. '''
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for urls in (int(count) for count in args.seen_urls.split(",")):
+        for exact in (False, True):
+            run = run_process(context, run_seen, args.config_file, urls, exact)
+            if run is None:
+                print(f"{urls} urls, {'exact' if exact else 'bloom'}: the run failed.")
+                continue
+            runs.append(run)
+            line = (f"{urls} urls, {run['set']}: add {run['add_ns']:.0f}ns, lookup "
+                    f"{run['new_lookup_ns']:.0f}ns new / {run['seen_lookup_ns']:.0f}ns seen, "
+                    f"+{run['rss_mb']:.0f}MB rss")
+            if not exact:
+                line += (f", {run['filter_mb']:.1f}MB filter, {run['store_lookup_rate']:.3%} "
+                         f"of new urls looked up in the save file "
+                         f"(expected {run['expected_rate']:.3%})")
+            print(line)
+    return runs
+
+
+def benchmark_restarts(args):
+    ''' Startup time of the frontier on save files of each size: a restart
+    that scans the save file, as after a crash, then one from the
+    checkpoint the first wrote when it closed. '''
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for urls in (int(count) for count in args.restart_urls.split(",")):
+        save_dir = tempfile.mkdtemp(prefix="benchmark-")
+        process = context.Process(target=build_save_file, args=(args.config_file, urls, save_dir))
+        process.start()
+        process.join()
+        for label in ("scan", "checkpoint"):
+            run = run_process(context, run_restart, args.config_file, urls, save_dir)
+            if run is None:
+                print(f"{urls} urls, {label}: the restart failed, see Logs/.")
+                break
+            runs.append(run)
+            print(f"{urls} urls, {label}: started in {run['started_seconds']:.2f}s, "
+                  f"first url after {run['first_url_seconds']:.2f}s, {run['queued']} urls "
+                  f"loaded after {run['loaded_seconds']:.2f}s, peak rss {run['peak_rss_mb']:.0f}MB")
+        shutil.rmtree(save_dir, ignore_errors=True)
+    return runs
+
+
+def write_reject_archive(path, pages):
+    ''' Writes an archive of pages cache server replies where one page in
+    ten is html over MAX_PAGE_SIZE (5MB) and one in ten a pdf (1MB), the
+    rest html pages of 30KB. Returns the urls. '''
+    rng = random.Random(0)
+    archive = ReplayArchive(path)
+    urls = []
+    for i in range(pages):
+        kind = ("large", "pdf")[i % 10] if i % 10 < 2 else "page"
+        url = f"https://www.ics.uci.edu/{kind}-{i}"
+        resp = requests.Response()
+        resp.url = url
+        resp.status_code = 200
+        if kind == "pdf":
+            resp.headers["Content-Type"] = "application/pdf"
+            resp._content = rng.randbytes(1000000)
+        else:
+            resp.headers["Content-Type"] = "text/html"
+            size = 5000000 if kind == "large" else 30000
+            resp._content = b"<html><body>" + b"x" * size + b"</body></html>"
+        archive.record(url, 200, cbor.dumps(
+            {"url": url, "status": 200, "response": pickle.dumps(resp)}))
+        urls.append(url)
+    archive.close()
+    return urls
+
+
+def baseline_download(url, config):
+    # the download it replaced: the whole reply read and unpickled, whatever its size or type
+    host, port = config.cache_server
+    resp = requests.get(
+        f"http://{host}:{port}/",
+        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+    return Response(cbor.loads(resp.content))
+
+
+def run_reject(config_file, cache_server, urls, early, results):
+    ''' Downloads urls with utils.download (or the download it replaced)
+    and counts the bytes read, the time taken and the pages left to parse. '''
+    from utils import download, get_logger
+    cparser = ConfigParser()
+    cparser.read(config_file)
+    config = Config(cparser)
+    config.cache_server = cache_server
+    logger = get_logger("BENCHMARK")
+
+    # bytes received from the cache server, counted where the http clients read them
+    received = [0]
+    recv_into = socket.socket.recv_into
+    def counted(self, buffer, *args):
+        count = recv_into(self, buffer, *args)
+        received[0] += count
+        return count
+    socket.socket.recv_into = counted
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    start = time.perf_counter()
+    parsed = 0
+    for url in urls:
+        if early:
+            resp = download.download(url, config, logger)
+        else:
+            resp = baseline_download(url, config)
+        parsed += resp.raw_response is not None
+    seconds = time.perf_counter() - start
+    cpu = resource.getrusage(resource.RUSAGE_SELF)
+    results.put({
+        "urls": len(urls), "download": "early" if early else "baseline", "seconds": seconds,
+        "cpu_seconds": cpu.ru_utime + cpu.ru_stime - usage.ru_utime - usage.ru_stime,
+        "read_mb": received[0] / 1024 / 1024, "parsed": parsed,
+        "rejected": download.download_stats()["rejected_pages"] if early else {}})
+
+
+def benchmark_reject(args):
+    ''' utils.download, which drops pages over MAX_PAGE_SIZE before reading
+    them and pages of other CONTENT_TYPES before handing them on, against
+    the download that read and unpickled every reply. '''
+    save_dir = tempfile.mkdtemp(prefix="benchmark-")
+    path = os.path.join(save_dir, "reject.replay")
+    urls = write_reject_archive(path, args.reject_pages)
+    archive = ReplayArchive(path)
+    server = ReplayServer(("127.0.0.1", args.port), archive).start()
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for early in (False, True):
+        run = run_process(
+            context, run_reject, args.config_file, server.server_address, urls, early)
+        if run is None:
+            print(f"{args.reject_pages} pages, {'early' if early else 'baseline'}: "
+                  f"the run failed, see Logs/.")
+            continue
+        runs.append(run)
+        rejected = ", ".join(f"{count} {reason}" for reason, count in run["rejected"].items())
+        print(f"{run['urls']} pages, {run['download']}: {run['seconds']:.2f}s, "
+              f"{run['cpu_seconds']:.2f}s cpu, {run['read_mb']:.1f}MB read, "
+              f"{run['parsed']} pages to parse" + (f" ({rejected} rejected)" if rejected else ""))
+    if len(runs) == 2:
+        before, after = runs
+        print(f"saved {before['read_mb'] - after['read_mb']:.1f}MB read, "
+              f"{before['seconds'] - after['seconds']:.2f}s and "
+              f"{before['cpu_seconds'] - after['cpu_seconds']:.2f}s cpu")
+    server.shutdown()
+    archive.close()
+    shutil.rmtree(save_dir, ignore_errors=True)
+    return runs
+
+
+def main():
+    parser = ArgumentParser(
+        description="Replays a recorded crawl (RECORD_FILE) against the crawler "
+                    "for several thread counts, without network access.")
+    parser.add_argument("archive", nargs="?", help="archive written with RECORD_FILE")
+    parser.add_argument("--synthetic_pages", type=int, default=0,
+                        help="without an archive, crawl a generated site of this many pages")
+    parser.add_argument("--worker", type=str, default="thread",
+                        help="comma separated WORKER modes to compare, the thread counts are "
+                             "ASYNC_TASKS of one async worker")
+    parser.add_argument("--parse_processes", type=str, default=None,
+                        help="comma separated PARSE_PROCESSES to compare")
+    parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--threads", type=str, default="1,2,4,8")
+    parser.add_argument("--priority", type=str, default="fifo",
+                        help="comma separated PRIORITY policies to compare")
+    parser.add_argument("--fetches", type=int, default=0,
+                        help="also report the unique pages found after this many fetches")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every reply")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--politeness", type=float, default=0.0,
+                        help="POLITENESS used for the runs, 0 measures the crawler itself")
+    parser.add_argument("--port", type=int, default=0, help="replay server port, 0 picks one")
+    parser.add_argument("--output", type=str, default=None, help="also write the results as json")
+    parser.add_argument("--restart_urls", type=str, default=None,
+                        help="instead time restarts from save files of these many urls")
+    parser.add_argument("--seen_urls", type=str, default=None,
+                        help="instead measure the seen url set at these many urls")
+    parser.add_argument("--simhash_tokens", type=str, default=None,
+                        help="instead time simhash on pages of these many tokens")
+    parser.add_argument("--filter_urls", type=int, default=0,
+                        help="instead time the url filter on this many urls")
+    parser.add_argument("--tokenize_pages", type=str, default=None,
+                        help="instead time tokenizing the html pages in this directory or archive")
+    parser.add_argument("--scheduler_threads", type=str, default=None,
+                        help="instead compare url scheduling on a fake clock for these thread counts")
+    parser.add_argument("--reject_pages", type=int, default=0,
+                        help="instead time downloads of this many pages, some too large or not html")
+    args = parser.parse_args()
+
+    # benchmarks that need no archive
+    for option, benchmark in (
+            ("restart_urls", benchmark_restarts), ("seen_urls", benchmark_seen),
+            ("simhash_tokens", benchmark_simhash), ("scheduler_threads", benchmark_scheduler),
+            ("tokenize_pages", benchmark_tokenize), ("filter_urls", benchmark_filter),
+            ("reject_pages", benchmark_reject)):
+        if getattr(args, option):
+            runs = benchmark(args)
+            if args.output:
+                with open(args.output, "w", encoding="utf-8") as f:
+                    json.dump(runs, f, indent=1)
+            return
+    seed_urls = None
+    if not args.archive:
+        if not args.synthetic_pages:
+            parser.error("an archive is needed, unless another benchmark is chosen")
+        args.archive = os.path.join(tempfile.mkdtemp(prefix="benchmark-"), "synthetic.replay")
+        seed_urls = write_synthetic_archive(args.archive, args.synthetic_pages)
+
+    archive = ReplayArchive(args.archive)
+    server = ReplayServer(
+        ("127.0.0.1", args.port), archive, args.latency, args.jitter, args.error_rate).start()
+    cache_server = server.server_address
+    print(f"Replaying {len(archive)} urls on {cache_server[0]}:{cache_server[1]}.")
+
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    parse_processes = [None]
+    if args.parse_processes:
+        parse_processes = [int(count) for count in args.parse_processes.split(",")]
+    for priority, worker, threads, processes in product(
+            args.priority.split(","), args.worker.split(","),
+            [int(count) for count in args.threads.split(",")], parse_processes):
+        save_dir = tempfile.mkdtemp(prefix="benchmark-")
+        run = run_process(
+            context, run_crawl, args.config_file, cache_server, worker, threads, processes,
+            priority, args.fetches, args.politeness, seed_urls, save_dir)
+        shutil.rmtree(save_dir, ignore_errors=True)
+        label = f"{priority}, {worker}, {'tasks' if worker == 'async' else 'threads'} {threads}"
+        if processes is not None:
+            label += f", parse processes {processes}"
+        if run is None:
+            print(f"{label}: the crawl failed, see Logs/.")
+            continue
+        runs.append(run)
+        stages = ", ".join(
+            f"{stage} {seconds * 1000:.2f}ms"
+            for stage, seconds in sorted(run["stage_seconds"].items()))
+        print(f"{label}: {run['pages']} pages in {run['seconds']:.1f}s, "
+              f"{run['pages_per_second']:.1f} pages/s, {run['unique_pages']} unique, "
+              f"peak rss {run['peak_rss_mb']:.0f}MB")
+        if args.fetches:
+            print(f"    unique pages after {args.fetches} fetches: {run['unique_at_fetches']}")
+        print(f"    mean per call: {stages}")
+
+    server.shutdown()
+    archive.close()
+    if seed_urls:
+        shutil.rmtree(os.path.dirname(args.archive), ignore_errors=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(runs, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
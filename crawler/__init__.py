@@ -1,11 +1,18 @@
-from utils import get_logger
+from utils import get_logger, metrics
 from crawler.frontier import Frontier
 from crawler.worker import Worker
+from utils import download
+import scraper
 
 class Crawler(object):
     def __init__(self, config, restart, frontier_factory=Frontier, worker_factory=Worker):
         self.config = config
         self.logger = get_logger("CRAWLER")
+        # before the frontier, which instruments its locks if metrics are on
+        metrics.configure(config)
+        download.configure(config)
+        # before the frontier, which may delete the save file on restart
+        scraper.configure(config, restart)
         self.frontier = frontier_factory(config, restart)
         self.workers = list()
         self.worker_factory = worker_factory
@@ -19,7 +26,17 @@ class Crawler(object):
 
     def start(self):
         self.start_async()
-        self.join()
+        try:
+            self.join()
+        finally:
+            # write out any progress the frontier has not saved yet
+            self.frontier.close()
+            scraper.close()
+            download.close()
+            self.logger.info(f"Cache server downloads: {download.download_stats()}")
+            self.logger.info(f"Stem cache: {scraper.stem_cache_stats()}")
+            self.logger.info(f"Exact duplicate pages: {scraper.exact_duplicates.stats()}")
+            metrics.close(self.config)
 
     def join(self):
         for worker in self.workers:
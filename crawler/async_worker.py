@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import aiohttp
+
+from crawler.worker import Worker
+from utils import get_logger, metrics
+from utils.download import download_async, trace_config
+import scraper
+
+
+class AsyncWorker(Worker):
+    ''' Worker thread that runs config.async_tasks downloads at once on one
+    event loop, instead of one blocking download at a time. The frontier
+    still decides when each domain may be fetched. '''
+    def __init__(self, worker_id, config, frontier):
+        super().__init__(worker_id, config, frontier)
+        self.logger = get_logger(f"AsyncWorker-{worker_id}", "Worker")
+
+    def run(self):
+        asyncio.run(self._crawl())
+
+    async def _crawl(self):
+        connector = aiohttp.TCPConnector(limit=self.config.async_tasks)
+        timeout = aiohttp.ClientTimeout(
+            sock_connect=self.config.connect_timeout,
+            sock_read=self.config.read_timeout)
+        async with aiohttp.ClientSession(
+                connector=connector, timeout=timeout,
+                trace_configs=[trace_config()]) as session:
+            await asyncio.gather(*(
+                self._fetch_loop(session) for _ in range(self.config.async_tasks)))
+        self.logger.info("Frontier is empty. Stopping Crawler.")
+
+    async def _fetch_loop(self, session):
+        loop = asyncio.get_running_loop()
+        idle_since = None
+        while True:
+            tbd_url, wait_time = self.frontier.poll_tbd_url()
+            if not tbd_url:
+                if wait_time is None:
+                    # same as get_tbd_url, stop after 10 sec without urls
+                    idle_since = idle_since or time.time()
+                    if time.time() - idle_since > 10:
+                        break
+                    wait_time = 1
+                await asyncio.sleep(min(wait_time, 1))
+                continue
+            idle_since = None
+
+            with metrics.timer("download"):
+                resp = await download_async(tbd_url, self.config, session, self.logger)
+            metrics.count("crawler_pages_downloaded_total")
+            self.logger.info(
+                f"Downloaded {tbd_url}, status <{resp.status}>, "
+                f"using cache {self.config.cache_server}.")
+            if resp.status is None:
+                # the cache server did not reply, try again later
+                self.frontier.requeue_url(tbd_url)
+                continue
+            # parsing is cpu bound, keep it off the event loop
+            await loop.run_in_executor(None, self._scrape, tbd_url, resp)
+
+    def _scrape(self, tbd_url, resp):
+        with metrics.timer("scrape"):
+            scraped_urls = scraper.scraper(tbd_url, resp)
+        with metrics.timer("frontier_update"):
+            for scraped_url in scraped_urls:
+                self.frontier.add_url(scraped_url)
+            self.frontier.mark_url_complete(tbd_url)
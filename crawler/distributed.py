@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import socket
+from itertools import chain
+from hashlib import blake2b
+from threading import Thread, Lock, Condition
+from multiprocessing.connection import Listener, Client, AuthenticationError
+from urllib.parse import urlparse
+
+from crawler.frontier import Frontier
+from crawler.store import LogStore
+from utils import get_logger
+import scraper
+
+
+def get_owner(url, node_count):
+    # node that crawls url. Partitioned by host, so every fetch from a host
+    # (with or without "www.") happens on one node and politeness stays local
+    host = urlparse(url).hostname or ""
+    if host.startswith("www."):
+        host = host[4:]
+    digest = blake2b(host.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % node_count
+
+
+class PartitionedFrontier(Frontier):
+    ''' Frontier of one node in a crawl split across config.node_count
+    processes. Each node owns the hosts get_owner assigns to it, keeps its
+    own save file, and forwards the urls it finds on other nodes' hosts to
+    them in batches.
+
+    Node i listens on config.node_host at config.node_base_port + i.
+    Urls waiting for a peer that can't be reached are kept, and saved in
+    SAVE + .outbox with every save file flush to be sent after a restart. A node only
+    reports an empty frontier once no urls were sent or received for
+    config.node_idle_timeout seconds. '''
+    def __init__(self, config, restart):
+        self.node_id = config.node_id
+        self.node_count = config.node_count
+        self.node_logger = get_logger(f"NODE-{config.node_id}", "NODE")
+        self.authkey = config.node_authkey.encode("utf-8")
+
+        # peer node id : urls waiting to be forwarded, a dict used as an ordered set
+        self.outbox = {peer: dict() for peer in range(self.node_count) if peer != self.node_id}
+        self.outbox_lock = Lock()
+        self.outbox_full = Condition(self.outbox_lock)
+        # peer node id : urls the forward thread is sending
+        self.sending = dict()
+        self.stopping = False
+        # peer node id : open connection, only used by the forward thread
+        self.connections = dict()
+        # connection from a peer : thread adding the urls it sends
+        self.receivers = dict()
+        self.forwarded = 0
+        self.received = 0
+        self.last_activity = time.time()
+
+        self.outbox_file = f"{config.save_file}.outbox"
+        fresh = restart or not self.store_factory.exists(config.save_file)
+        if fresh and os.path.exists(self.outbox_file):
+            os.remove(self.outbox_file)
+        if os.path.exists(self.outbox_file):
+            with open(self.outbox_file, encoding="utf-8") as f:
+                for peer, urls in json.load(f).items():
+                    self.outbox[int(peer)].update(dict.fromkeys(urls))
+        # seed urls of other nodes go to the outbox
+        super().__init__(config, restart)
+
+        self.listener = Listener(
+            (config.node_host, config.node_base_port + self.node_id),
+            backlog=self.node_count, authkey=self.authkey)
+        Thread(target=self._accept_loop, daemon=True).start()
+        self.forward_thread = Thread(target=self._forward_loop, daemon=True)
+        self.forward_thread.start()
+        self.node_logger.info(
+            f"Node {self.node_id} of {self.node_count} listening on "
+            f"{config.node_host}:{config.node_base_port + self.node_id}.")
+
+    def add_url(self, url):
+        url = scraper.canonicalizer.canonicalize(url)
+        peer = get_owner(url, self.node_count)
+        if peer == self.node_id:
+            super().add_url(url)
+            return
+        with self.outbox_lock:
+            urls = self.outbox[peer]
+            urls[url] = None
+            if len(urls) >= self.config.node_forward_batch:
+                self.outbox_full.notify()
+
+    def poll_tbd_url(self):
+        url, wait_time = super().poll_tbd_url()
+        if url is None and wait_time is None and (
+                time.time() - self.last_activity < self.config.node_idle_timeout):
+            # nothing queued here, but peers are still busy and may send urls
+            return None, 1.0
+        return url, wait_time
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn = self.listener.accept()
+            except AuthenticationError as e:
+                self.node_logger.error(f"Rejected connection: {e}.")
+                continue
+            except OSError:
+                # listener closed
+                return
+            receiver = Thread(target=self._receive_loop, args=(conn,), daemon=True)
+            with self.outbox_lock:
+                if self.stopping:
+                    conn.close()
+                    return
+                self.receivers[conn] = receiver
+            receiver.start()
+
+    def _receive_loop(self, conn):
+        with conn:
+            while True:
+                try:
+                    urls = conn.recv()
+                except (EOFError, OSError):
+                    break
+                with self.outbox_lock:
+                    self.last_activity = time.time()
+                    self.received += len(urls)
+                for url in urls:
+                    super().add_url(url)
+        with self.outbox_lock:
+            self.receivers.pop(conn, None)
+
+    def _stop_receivers(self):
+        # ends every receive loop and waits for the urls it is adding, so
+        # nothing is added once the save file is closed
+        with self.outbox_lock:
+            receivers = list(self.receivers.items())
+        for conn, receiver in receivers:
+            try:
+                # shutting down the socket wakes up a recv() in progress
+                with socket.fromfd(conn.fileno(), socket.AF_INET, socket.SOCK_STREAM) as sock:
+                    sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                # already closed by the peer
+                pass
+        for conn, receiver in receivers:
+            receiver.join()
+
+    def _send(self, peer, urls):
+        conn = self.connections.get(peer)
+        try:
+            if conn is None:
+                conn = self.connections[peer] = Client(
+                    (self.config.node_host, self.config.node_base_port + peer),
+                    authkey=self.authkey)
+            conn.send(urls)
+        except (OSError, EOFError, AuthenticationError) as e:
+            self.node_logger.info(f"Could not forward {len(urls)} urls to node {peer}: {e!r}.")
+            if conn is not None:
+                conn.close()
+            self.connections.pop(peer, None)
+            return False
+        self.last_activity = time.time()
+        self.forwarded += len(urls)
+        return True
+
+    def _forward_loop(self):
+        while True:
+            with self.outbox_lock:
+                if not self.stopping and all(
+                        len(urls) < self.config.node_forward_batch
+                        for urls in self.outbox.values()):
+                    self.outbox_full.wait(self.config.node_forward_interval)
+                stopping = self.stopping
+                batches = {peer: list(urls) for peer, urls in self.outbox.items() if urls}
+                for peer in batches:
+                    self.outbox[peer] = dict()
+                self.sending = batches
+
+            for peer, urls in batches.items():
+                if not self._send(peer, urls):
+                    # put them back in front of anything added meanwhile
+                    with self.outbox_lock:
+                        waiting = dict.fromkeys(urls)
+                        waiting.update(self.outbox[peer])
+                        self.outbox[peer] = waiting
+            with self.outbox_lock:
+                self.sending = dict()
+            if stopping:
+                return
+
+    def _unsent(self):
+        # peer : urls not known to be delivered, the batch being sent included
+        with self.outbox_lock:
+            return {
+                peer: list(dict.fromkeys(chain(self.sending.get(peer, ()), urls)))
+                for peer, urls in self.outbox.items()
+                if urls or self.sending.get(peer)}
+
+    def _flush(self):
+        # the outbox is saved with the frontier, so a crash loses neither
+        # more than one save interval of urls for other nodes
+        super()._flush()
+        unsent = self._unsent()
+        if unsent:
+            with open(self.outbox_file + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(unsent, f)
+            os.replace(self.outbox_file + ".tmp", self.outbox_file)
+        elif os.path.exists(self.outbox_file):
+            os.remove(self.outbox_file)
+
+    def close(self):
+        with self.outbox_lock:
+            if self.stopping:
+                return
+            self.stopping = True
+            self.outbox_full.notify()
+        self.listener.close()
+        self._stop_receivers()
+        # one last attempt to deliver everything
+        self.forward_thread.join()
+        for conn in self.connections.values():
+            conn.close()
+
+        self.node_logger.info(
+            f"Node {self.node_id}: forwarded {self.forwarded} urls, received "
+            f"{self.received}, {sum(len(urls) for urls in self._unsent().values())} "
+            f"left for the next run.")
+        # saves the outbox with the last batch
+        super().close()
+
+
+class PartitionedLogFrontier(PartitionedFrontier):
+    ''' PartitionedFrontier saved like LogFrontier. '''
+    store_factory = LogStore
@@ -1,136 +1,579 @@
 import os
-import shelve
-from threading import Thread, RLock
-from queue import Queue, Empty
-from collections import defaultdict
+from threading import Thread, RLock, Condition, local
+from collections import defaultdict, deque, Counter
+from itertools import count, islice, chain
+from heapq import heappush, heappop
 from urllib.parse import urlparse
 import time
-from utils import get_logger, get_urlhash, normalize
-from scraper import is_valid
-from scraper import unique_pages, page_word_counts, token_counts
-from collections import Counter
+from utils import get_logger, get_urlhash, metrics
+from utils.seen import SeenSet, get_urlkey
+from crawler.store import ShelveStore, LogStore
+from crawler.traps import TrapDetector
+from crawler.priority import POLICIES
+from crawler import recovery
+import scraper
 
 class Frontier(object):
+    # backend that keeps the frontier progress, see crawler/store.py
+    store_factory = ShelveStore
+
     def __init__(self, config, restart):
         self.logger = get_logger("FRONTIER")
         self.config = config
 
-        # uses queue instead of list for thread safety
-        self.to_be_downloaded = Queue()
+        # scores urls when a PRIORITY policy is set, see crawler/priority.py
+        policy = POLICIES[config.priority]
+        self.policy = policy(self) if policy else None
+        # domain name : urls waiting to be downloaded from that domain, in
+        # discovery order, or a heap of (score, discovery order, url)
+        self.to_be_downloaded = defaultdict(list if self.policy else deque)
+        self.discovery_order = count()
+
+        # heap of (next allowed fetch time, domain name) for every
+        # domain that has urls waiting, so the next ready domain is on top
+        self.ready_times = []
+        # with a policy, heap of (best score, domain name) of the domains
+        # whose fetch time has come, so the best ready url goes first.
+        # ready_scores holds each one's current score, an entry with
+        # another score was replaced when a better url was queued
+        self.ready_domains = []
+        self.ready_scores = dict()
+        self.scheduled = set()
+        # host : urls handed out to workers, for the policies
+        self.host_fetches = Counter()
+        # page the current thread is scraping, its links are added next
+        self.current_page = local()
+        # urls handed out to workers and not completed yet
+        self.in_flight = set()
+        # heap of (retry time, url) of urls whose download failed, see requeue_url
+        self.retry_times = []
+        # url : failed downloads, and the urls left for the next start
+        self.failures = Counter()
+        self.given_up = set()
 
         # domain name : timestamp
         # timestamp defaults to 0.0
         self.domain_last_seen = defaultdict(float)
-        self.lock = RLock()
+        self.lock = metrics.timed_lock(RLock(), "frontier")
+        # workers wait on this when no domain is ready to be fetched
+        self.has_work = Condition(self.lock)
+
+        # urlhash : (url, completed) changes that are not in the save file yet.
+        # They are written in batches by the save thread, so at most
+        # config.save_interval seconds of progress is lost on a crash.
+        self.unsaved = dict()
+        self.flushing = dict()
+        # number of batches taken for writing, a save file lookup done
+        # while this changed may have missed a url moved there meanwhile
+        self.flushes = 0
+        self.save_lock = metrics.timed_lock(RLock(), "save_file")
+        self.unsaved_full = Condition(self.lock)
+        self.closed = False
+
+        # a save file keyed with other url rules is moved here, and keyed
+        # again into a new one by the loader, see _rekey_save_file
+        self.rekey_file = f"{self.config.save_file}.rekey"
+        fresh = restart or not (
+            self.store_factory.exists(self.config.save_file)
+            or self.store_factory.exists(self.rekey_file))
+        self.traps = TrapDetector(config, f"{self.config.save_file}.traps", fresh)
+        # urls left to download at the last clean close, see crawler/recovery.py
+        self.pending_file = f"{self.config.save_file}.pending"
+        if fresh and os.path.exists(self.pending_file):
+            os.remove(self.pending_file)
+        # near duplicate pages count towards trap detection
+        scraper.page_listeners.append(self.traps.record_page)
+        scraper.page_listeners.append(self._page_parsed)
         
-        if not os.path.exists(self.config.save_file) and not restart:
+        if not self.store_factory.exists(self.config.save_file) and not restart:
             # Save file does not exist, but request to load save.
             self.logger.info(
                 f"Did not find save file {self.config.save_file}, "
                 f"starting from seed.")
-        elif os.path.exists(self.config.save_file) and restart:
+        elif self.store_factory.exists(self.config.save_file) and restart:
             # Save file does exists, but request to start from seed.
             self.logger.info(
                 f"Found save file {self.config.save_file}, deleting it.")
-            os.remove(self.config.save_file)
+            self.store_factory.remove(self.config.save_file)
+        # urls are keyed by their canonical form, with the rules in keys_file
+        self.keys_file = f"{self.config.save_file}.keys"
+        if fresh:
+            if self.store_factory.exists(self.rekey_file):
+                self.store_factory.remove(self.rekey_file)
+            self._write_keys()
+        elif self.store_factory.exists(self.rekey_file):
+            # keying it again was cut short, start over
+            if self.store_factory.exists(self.config.save_file):
+                self.store_factory.remove(self.config.save_file)
+        elif self._read_keys() != scraper.canonicalizer.digest():
+            self.store_factory.move(self.config.save_file, self.rekey_file)
+        self.rekeying = not fresh and self.store_factory.exists(self.rekey_file)
+        if self.rekeying and os.path.exists(self.pending_file):
+            # the checkpoint holds a filter of the old keys
+            os.remove(self.pending_file)
         # Load existing save file, or create one if it does not exist.
-        self.save = shelve.open(self.config.save_file)
-        if restart:
+        self.save = self.store_factory(self.config.save_file)
+
+        # answers most "have we seen this url" checks in memory, only
+        # possible hits are looked up in the save file
+        self.seen = SeenSet(
+            self.config.seen_capacity, self.config.seen_error_rate,
+            self.config.seen_memory, contains=self._is_saved)
+        # the scraper's set of pages already scraped is sized the same way,
+        # its possible hits are checked for completion in the save file
+        scraper.visited_urls = SeenSet(
+            self.config.seen_capacity, self.config.seen_error_rate,
+            self.config.seen_memory, contains=self._is_completed)
+        # until the save file is loaded, the filter is missing its urls and
+        # every check goes to the save file
+        self.seen_loaded = True
+        # set while the save file is loaded, the save thread writes to it
+        # meanwhile, see _flush
+        self.loading = False
+        self.loader = None
+
+        if restart or not (self.save or self.rekeying):
             for url in self.config.seed_urls:
                 self.add_url(url)
         else:
-            # Set the frontier state with contents of save file.
-            self._parse_save_file()
-            if not self.save:
-                for url in self.config.seed_urls:
-                    self.add_url(url)
+            # Set the frontier state with contents of save file, in the
+            # background so the workers can start on the first urls loaded.
+            self.seen_loaded = False
+            self.loading = True
+            self.loader = Thread(target=self._parse_save_file, daemon=True)
+            self.loader.start()
+
+        self.save_thread = Thread(target=self._save_loop, daemon=True)
+        self.save_thread.start()
+
+        metrics.gauge("crawler_frontier_queue_depth", self._queue_depth)
+        metrics.gauge("crawler_frontier_domains_waiting", lambda: len(self.scheduled))
+        metrics.gauge("crawler_frontier_domain_ready_seconds", self._domain_ready_times)
+        metrics.gauge("crawler_frontier_unsaved_changes", lambda: len(self.unsaved))
+
+    def _write_keys(self):
+        with open(self.keys_file, "w") as f:
+            f.write(scraper.canonicalizer.digest())
+
+    def _read_keys(self):
+        if not os.path.exists(self.keys_file):
+            return None
+        with open(self.keys_file) as f:
+            return f.read().strip()
+
+    def _rekey_save_file(self):
+        ''' Runs in the loader thread before the save file is read: copies
+        the urls of the save file written with other url rules into the
+        new one, keyed with the current rules, in one pass. Variants of a
+        url that now share a key become one entry, completed if any of
+        them was. Returns False if the frontier was closed meanwhile, the
+        next start keys it again. '''
+        start = time.time()
+        old = self.store_factory(self.rekey_file)
+        total_count = len(old)
+        try:
+            for entries in self._saved_chunks(old.entries()):
+                with self.lock:
+                    if self.closed:
+                        return False
+                with self.save_lock:
+                    for url, completed in entries:
+                        url = scraper.canonicalizer.canonicalize(url)
+                        urlhash = get_urlhash(scraper.canonicalizer.key(url))
+                        # a pending variant doesn't replace a completed one
+                        if completed or urlhash not in self.save:
+                            self.save.put(urlhash, url, completed)
+                    self.save.sync()
+        finally:
+            old.close()
+        self._write_keys()
+        self.store_factory.remove(self.rekey_file)
+        with self.save_lock:
+            count = len(self.save)
+        self.logger.info(
+            f"Keyed {self.config.save_file} with the current url rules: {total_count} "
+            f"urls became {count}, in {time.time() - start:.1f}s.")
+        return True
+
+    def _queue_depth(self):
+        with self.lock:
+            return sum(len(urls) for urls in self.to_be_downloaded.values())
+
+    def _domain_ready_times(self):
+        # domain : seconds until it may be fetched again, negative if overdue
+        cur_time = time.time()
+        with self.lock:
+            ready_times = {domain: ready_time - cur_time for ready_time, domain in self.ready_times}
+            for domain in self.ready_scores:
+                ready_times[domain] = (
+                    self.domain_last_seen[domain] + self.config.time_delay - cur_time)
+            return ready_times
+
+    def _page_parsed(self, url, duplicate):
+        # called by the scraper in the thread that then adds the page's links
+        self.current_page.url = url
 
     def _parse_save_file(self):
-        ''' This function can be overridden for alternate saving techniques. '''
-        total_count = len(self.save)
+        ''' This function can be overridden for alternate saving techniques.
+        Runs in the loader thread: queues the urls to be downloaded in
+        chunks, from the checkpoint of the last clean close or else from a
+        scan of the save file, then fills the seen url filter. '''
+        if self.rekeying and not self._rekey_save_file():
+            return
+        start = time.time()
+        first_chunk = None
+        with self.save_lock:
+            total_count = len(self.save)
+        checkpoint = recovery.PendingCheckpoint.open(
+            self.pending_file, self._checkpoint_header(total_count))
+        if checkpoint:
+            with self.lock:
+                self.seen_loaded = self.seen.restore_filter(
+                    checkpoint.header["seen"], checkpoint.filter_bits)
+            chunks = checkpoint.chunks()
+        else:
+            chunks = recovery.validate_chunks(
+                self._saved_chunks(self.save.pending()), self.config.url_rules,
+                self.config.recovery_processes)
+
         tbd_count = 0
-        for url, completed in self.save.values():
-            if not completed and is_valid(url):
-                self.to_be_downloaded.put(url)
-                tbd_count += 1
+        try:
+            for domains in chunks:
+                with self.lock:
+                    if self.closed:
+                        return
+                    for domain, urls in domains.items():
+                        for url in urls:
+                            self._enqueue(url, domain=domain)
+                        tbd_count += len(urls)
+                    self.has_work.notify_all()
+                first_chunk = first_chunk or time.time() - start
+        finally:
+            chunks.close()
+
+        if not self.seen_loaded:
+            for keys in self._saved_chunks(self.save.keys()):
+                with self.lock:
+                    if self.closed:
+                        return
+                    for key in keys:
+                        self.seen.add_key(key)
+        with self.lock:
+            self.seen_loaded = True
+            self.loading = False
+            # workers waiting for urls can stop if there are none, and the
+            # save thread writes what was crawled meanwhile
+            self.has_work.notify_all()
+            self.unsaved_full.notify()
         self.logger.info(
             f"Found {tbd_count} urls to be downloaded from {total_count} "
-            f"total urls discovered.")
+            f"total urls discovered, "
+            f"{'from the checkpoint' if checkpoint else 'by scanning the save file'} "
+            f"in {time.time() - start:.1f}s (first urls after {first_chunk or 0:.1f}s).")
+
+    def _saved_chunks(self, items):
+        # chunks of an iterator over the save file, each read under the save
+        # lock as workers look up urls in it meanwhile
+        while True:
+            with self.save_lock:
+                chunk = list(islice(items, self.config.recovery_chunk))
+            if not chunk:
+                return
+            yield chunk
+
+    def _checkpoint_header(self, total_count):
+        # a checkpoint only matches the save file and url rules it was written with
+        return {"saved": total_count, "rules": recovery.rules_digest(self.config.url_rules)}
+
+    def _write_checkpoint(self):
+        # urls left to download, the ones handed out but not completed
+        # first, so the next start does not have to scan the save file
+        with self.lock:
+            domains = list(recovery.group_by_domain(chain(
+                self.in_flight, (url for retry_time, url in self.retry_times),
+                self.given_up)).items())
+            for domain, queued in self.to_be_downloaded.items():
+                if self.policy:
+                    # scored again when loaded, keep the discovery order
+                    queued = [url for score, order, url in sorted(queued, key=lambda entry: entry[1])]
+                domains.append((domain, list(queued)))
+            state, filter_bits = self.seen.filter_state()
+            filter_bits = bytes(filter_bits)
+        with self.save_lock:
+            header = dict(self._checkpoint_header(len(self.save)), seen=state)
+        recovery.write_pending(
+            self.pending_file, header, filter_bits, domains, self.config.recovery_chunk)
+
+    def _enqueue(self, url, parent=None, domain=None):
+        domain = domain or urlparse(url).netloc
+        with self.lock:
+            if self.policy:
+                heappush(self.to_be_downloaded[domain], (
+                    self.policy.score(url, parent), next(self.discovery_order), url))
+                if domain in self.ready_scores:
+                    # waiting for a fetch, it competes with its new best url
+                    score = self._domain_score(domain)
+                    if score < self.ready_scores[domain]:
+                        self.ready_scores[domain] = score
+                        heappush(self.ready_domains, (score, domain))
+            else:
+                self.to_be_downloaded[domain].append(url)
+            if domain not in self.scheduled:
+                # domain had nothing waiting, schedule it for its next allowed fetch
+                self.scheduled.add(domain)
+                heappush(self.ready_times, (
+                    self.domain_last_seen[domain] + self.config.time_delay, domain))
+                self.has_work.notify()
+
+    def poll_tbd_url(self):
+        ''' Non-blocking get_tbd_url. Returns (url, None) if a domain is
+        ready now, (None, seconds until the next domain is ready), or
+        (None, None) if no urls are waiting. '''
+        with self.lock:
+            while True:
+                cur_time = time.time()
+                while self.retry_times and self.retry_times[0][0] <= cur_time:
+                    self._enqueue(heappop(self.retry_times)[1])
+                domain, wait_time = self._pop_ready_domain(cur_time)
+                if domain is None:
+                    if self.retry_times:
+                        # failed downloads are tried again later
+                        retry_wait = self.retry_times[0][0] - cur_time
+                        wait_time = retry_wait if wait_time is None else min(wait_time, retry_wait)
+                    if wait_time is None and self.loading:
+                        # more urls are coming from the save file
+                        return None, 1.0
+                    return None, wait_time
+
+                urls = self.to_be_downloaded[domain]
+                url = heappop(urls)[-1] if self.policy else urls.popleft()
+                blocked = self.traps.is_blocked(url)
+                if blocked:
+                    # found to be part of a trap after it was queued, skip it
+                    # and don't load it again on restart
+                    self._record(scraper.get_url_key(url), url, True)
+                else:
+                    self.domain_last_seen[domain] = cur_time
+                    self.host_fetches[domain] += 1
+                    self.in_flight.add(url)
+                if urls:
+                    heappush(self.ready_times, (
+                        self.domain_last_seen[domain] + self.config.time_delay, domain))
+                else:
+                    del self.to_be_downloaded[domain]
+                    self.scheduled.discard(domain)
+                if not blocked:
+                    return url, None
+
+    def _pop_ready_domain(self, cur_time):
+        # Returns (domain that may be fetched now, None), or (None, seconds
+        # until the next domain is ready), or (None, None) if none are waiting
+        if self.policy:
+            # every domain past its politeness delay competes on its best url
+            while self.ready_times and self.ready_times[0][0] <= cur_time:
+                ready_time, domain = heappop(self.ready_times)
+                score = self.ready_scores[domain] = self._domain_score(domain)
+                heappush(self.ready_domains, (score, domain))
+            while self.ready_domains:
+                score, domain = heappop(self.ready_domains)
+                if self.ready_scores.get(domain) == score:
+                    del self.ready_scores[domain]
+                    return domain, None
+        elif self.ready_times and self.ready_times[0][0] <= cur_time:
+            return heappop(self.ready_times)[1], None
+        if self.ready_times:
+            return None, self.ready_times[0][0] - cur_time
+        return None, None
+
+    def _domain_score(self, domain):
+        # best url score plus the host terms, from the fetches made until
+        # now. A ready domain is not fetched from while it waits, so they
+        # stay current, and a better url queued meanwhile scores it again
+        return self.to_be_downloaded[domain][0][0] + self.policy.host_score(domain)
 
     def get_tbd_url(self):
-        try:
-            # wait 10 sec if queue is empty
-            url = self.to_be_downloaded.get(timeout=10)
-        except Empty:
-            return None
-        
-        domain = urlparse(url).netloc
+        # wait 10 sec if no urls are waiting
+        deadline = time.time() + 10
+        with self.has_work:
+            while True:
+                url, wait_time = self.poll_tbd_url()
+                if url:
+                    return url
+                if wait_time is None:
+                    wait_time = deadline - time.time()
+                    if wait_time <= 0:
+                        return None
+                # no domain can be fetched yet, wait for the earliest one
+                # (or for a new domain to be added)
+                self.has_work.wait(wait_time)
+
+    def _is_saved(self, urlhash):
+        # called without the frontier lock, a lookup only waits on a flush
+        with self.save_lock:
+            return urlhash in self.save
 
+    def _is_completed(self, urlhash):
         with self.lock:
-            cur_time = time.time()
-            elapsed_time = cur_time - self.domain_last_seen[domain]
-            if elapsed_time > self.config.time_delay:  # domain hasn't been accessed recently
-                self.domain_last_seen[domain] = cur_time
-                return url
-            
-            # sets new domain accessed time before
-            # sleeping to delay other worker threads
-            sleep_time = self.config.time_delay - elapsed_time
-            self.domain_last_seen[domain] = cur_time + sleep_time
+            entry = self.unsaved.get(urlhash) or self.flushing.get(urlhash)
+        if entry is not None:
+            return entry[1]
+        with self.save_lock:
+            return self.save.is_completed(urlhash)
+
+    def _seen_in_memory(self, urlhash):
+        # True or False if the seen filter and the unsaved changes know
+        # whether urlhash was seen, None if the save file has to be checked
+        if self.seen_loaded and not self.seen.might_contain(urlhash):
+            return False
+        if urlhash in self.unsaved or urlhash in self.flushing:
+            return True
+        return None
 
-        time.sleep(sleep_time)
-        with self.lock:  
-            self.domain_last_seen[domain] = time.time()
-            return url
+    def _record(self, urlhash, url, completed):
+        with self.lock:
+            self.unsaved[urlhash] = (url, completed)
+            if len(self.unsaved) >= self.config.save_batch:
+                self.unsaved_full.notify()
 
     def add_url(self, url):
-        url = normalize(url)
-        urlhash = get_urlhash(url)
+        # variants of a url are one frontier entry, see utils/canonical.py
+        url = scraper.canonicalizer.canonicalize(url)
+        urlhash = get_urlhash(scraper.canonicalizer.key(url))
         with self.lock:
-            if urlhash not in self.save:
-                self.save[urlhash] = (url, False)
-                self.save.sync()
-                self.to_be_downloaded.put(url)
+            seen = self._seen_in_memory(urlhash)
+            if seen is False:
+                self._add_new(urlhash, url)
+            if seen is not None:
+                return
+            flushes = self.flushes
+        # possibly seen: look in the save file without the frontier lock,
+        # then check again for the url being added by another thread
+        while True:
+            saved = self._is_saved(urlhash)
+            with self.lock:
+                if saved or urlhash in self.unsaved or urlhash in self.flushing:
+                    return
+                if flushes == self.flushes:
+                    # no batch was written during the lookup, so it can't
+                    # have missed the url
+                    if self.seen_loaded:
+                        self.seen.false_positive()
+                    self._add_new(urlhash, url)
+                    return
+                flushes = self.flushes
+
+    def _add_new(self, urlhash, url):
+        self.seen.add(urlhash)
+        if self.traps.allow(url):
+            self._record(urlhash, url, False)
+            self._enqueue(url, getattr(self.current_page, "url", None))
+        else:
+            # skipped for good: found again, it is not new and does not
+            # count towards its trap patterns again
+            self._record(urlhash, url, True)
     
     def mark_url_complete(self, url):
-        urlhash = get_urlhash(url)
+        urlhash = scraper.get_url_key(url)
         with self.lock:
-            if urlhash not in self.save:
+            self.in_flight.discard(url)
+            self.failures.pop(url, None)
+            if self.seen_loaded and get_urlkey(urlhash) not in self.seen.filter:
                 # This should not happen.
                 self.logger.error(
                     f"Completed url {url}, but have not seen it before.")
 
-            self.save[urlhash] = (url, True)
+            self._record(urlhash, url, True)
+
+    def requeue_url(self, url):
+        ''' Puts back a url whose download failed without a reply from the
+        cache server, config.requeue_delay seconds later, up to
+        config.requeues times. After that it stays pending in the save
+        file for the next start. '''
+        with self.lock:
+            self.in_flight.discard(url)
+            self.failures[url] += 1
+            if self.failures[url] > self.config.requeues:
+                self.logger.error(
+                    f"Could not download {url} after {self.config.requeues} "
+                    f"retries, leaving it for the next start.")
+                self.given_up.add(url)
+                return
+            heappush(self.retry_times, (time.time() + self.config.requeue_delay, url))
+            self.has_work.notify()
+
+    def _save_loop(self):
+        while True:
+            with self.lock:
+                if not self.closed and len(self.unsaved) < self.config.save_batch:
+                    self.unsaved_full.wait(self.config.save_interval)
+                if self.closed:
+                    return
+            self._flush()
+
+    def _flush(self):
+        with self.lock:
+            if not self.unsaved:
+                return
+            self.flushing, self.unsaved = self.unsaved, dict()
+            self.flushes += 1
+        # the stats of these pages go to disk first, so none is saved as
+        # completed without being counted
+        scraper.stats.save()
+        # workers only wait on the save file for urls not seen in memory.
+        # The loader may be reading it meanwhile: the stores iterate over
+        # the urls there when it started, the ones written since are queued
+        # already.
+        with self.save_lock, metrics.timer("save_flush"):
+            for urlhash, (url, completed) in self.flushing.items():
+                self.save.put(urlhash, url, completed)
             self.save.sync()
+        with self.lock:
+            self.flushing = dict()
+
+    def close(self):
+        # stop the save thread and write whatever is left
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.unsaved_full.notify_all()
+        self.save_thread.join()
+        if self.loader:
+            self.loader.join()
+        self._flush()
+        if not self.loading:
+            self._write_checkpoint()
+        self.logger.info(f"Seen url set: {self.seen.stats()}")
+        self.logger.info(f"Visited url set: {scraper.visited_urls.stats()}")
+        with self.save_lock:
+            self.save.close()
 
     def print_crawl_stats(self):
         log_file = os.path.join("Logs", "crawl_stats.txt")
+        stats = scraper.stats
 
         with open(log_file, "w", encoding="utf-8") as f:
             f.write("-------------CRAWL STATS------------\n")
             
-            total_pages = len(unique_pages)
+            total_pages = stats.get_total_pages()
             f.write(f"Total unique pages: {total_pages}\n")
             print(f"Total unique pages: {total_pages}")
 
-            if page_word_counts:
-                longest_page = max(page_word_counts, key=page_word_counts.get)
-                most_words = page_word_counts[longest_page]
+            longest_page, most_words = stats.get_longest_page()
+            if longest_page:
                 f.write(f"Longest page: {longest_page} with {most_words} words\n")
                 print(f"Longest page: {longest_page} with {most_words} words")
 
-            top_words = Counter(token_counts).most_common(50)
+            top_words = stats.get_top_words(50)
             f.write("Top 50 most common words:\n")
             print("Top 50 most common words:")
             for word, count in top_words:
                 f.write(f"{word}: {count}\n")
                 print(f"{word}: {count}")
 
-            subdomains = defaultdict(int)
-            for url in unique_pages:
-                netloc = urlparse(url).netloc.lower()
-                if netloc.endswith(".uci.edu"):
-                    subdomains[netloc] += 1
+            subdomains = {
+                netloc: count for netloc, count in stats.get_subdomains().items()
+                if netloc.endswith(".uci.edu")}
 
             f.write("Subdomains found in uci.edu:\n")
             print("Subdomains found in uci.edu:")
@@ -138,4 +581,10 @@ class Frontier(object):
                 f.write(f"{sub}, {count}\n")
                 print(f"{sub}, {count}")
 
-        print(f"Crawl stats saved to {log_file}")
\ No newline at end of file
+        print(f"Crawl stats saved to {log_file}")
+
+
+class LogFrontier(Frontier):
+    ''' Frontier saved in an append-only log with a compact hash index.
+    Pass it as frontier_factory to Crawler. '''
+    store_factory = LogStore
\ No newline at end of file
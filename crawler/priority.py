@@ -0,0 +1,89 @@
+import math
+from urllib.parse import urlparse
+
+# Scoring policies for the frontier, selected with PRIORITY in config.ini.
+# Lower is fetched sooner. score(url, parent) scores a url once, when it is
+# queued. parent is the url of the page the link was found on, or None for
+# seeds, urls loaded from the save file and urls put back after a failed
+# download. host_score(host) is added to the best url score of a host each
+# time it competes for the next fetch, so it follows the fetches made since.
+# Url scores are simply computed again when the save file is loaded.
+
+
+class DepthPolicy(object):
+    ''' Shallow urls first: path segments, plus one for a query. '''
+    def __init__(self, frontier):
+        self.frontier = frontier
+
+    def score(self, url, parent):
+        parsed = urlparse(url)
+        depth = sum(1 for segment in parsed.path.split("/") if segment)
+        return depth + (1 if parsed.query else 0)
+
+    def host_score(self, host):
+        return 0
+
+
+class CoveragePolicy(object):
+    ''' Urls on hosts that were not fetched from yet first, so every
+    subdomain gets visited early. '''
+    def __init__(self, frontier):
+        self.frontier = frontier
+
+    def score(self, url, parent):
+        return 0
+
+    def host_score(self, host):
+        return 1 if self.frontier.host_fetches[host] else 0
+
+
+class SaturationPolicy(object):
+    ''' Urls on hosts that were fetched from less first. '''
+    def __init__(self, frontier):
+        self.frontier = frontier
+
+    def score(self, url, parent):
+        return 0
+
+    def host_score(self, host):
+        return math.log2(1 + self.frontier.host_fetches[host])
+
+
+class DuplicatePolicy(object):
+    ''' Links found on pages of a template that mostly gives near duplicate
+    pages (see crawler/traps.py) last. '''
+    def __init__(self, frontier):
+        self.frontier = frontier
+
+    def score(self, url, parent):
+        return self.frontier.traps.duplicate_rate(parent) if parent else 0.0
+
+    def host_score(self, host):
+        return 0
+
+
+class CombinedPolicy(object):
+    ''' Sum of the other policies: depth, plus a point for a host already
+    fetched from, plus log2 of that host's fetches, plus up to 10 for a
+    parent template of near duplicates. '''
+    def __init__(self, frontier):
+        self.policies = [
+            (1, DepthPolicy(frontier)), (1, CoveragePolicy(frontier)),
+            (1, SaturationPolicy(frontier)), (10, DuplicatePolicy(frontier))]
+
+    def score(self, url, parent):
+        return sum(weight * policy.score(url, parent) for weight, policy in self.policies)
+
+    def host_score(self, host):
+        return sum(weight * policy.host_score(host) for weight, policy in self.policies)
+
+
+# PRIORITY in config.ini : policy, "fifo" fetches each domain's urls in discovery order
+POLICIES = {
+    "fifo": None,
+    "depth": DepthPolicy,
+    "coverage": CoveragePolicy,
+    "saturation": SaturationPolicy,
+    "duplicates": DuplicatePolicy,
+    "combined": CombinedPolicy,
+}
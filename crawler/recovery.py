@@ -0,0 +1,122 @@
+import os
+import json
+import multiprocessing
+from hashlib import blake2b
+from collections import deque, defaultdict
+from urllib.parse import urlparse
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.url_filter import UrlFilter
+import scraper
+
+# Restart recovery for the frontier: the checkpoint of pending urls written
+# on a clean close, and chunked validation of urls read back from the save
+# file when there is no checkpoint.
+
+# url rules of the validation processes, set by _init_filter
+_url_filter = None
+
+
+def rules_digest(path):
+    # a checkpoint is only trusted with the url rules it was validated with
+    with open(path, "rb") as f:
+        return blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def group_by_domain(urls, url_filter=None):
+    # the chunks the frontier loads are domain : urls, so it does not parse
+    # every url again to find its queue. urlparse caches its last results,
+    # parsing right after is_valid is nearly free
+    domains = defaultdict(list)
+    for url in urls:
+        if url_filter is None or url_filter.is_valid(url):
+            domains[urlparse(url).netloc].append(url)
+    return dict(domains)
+
+
+def write_pending(path, header, filter_bits, domains, chunk_size):
+    ''' Writes the checkpoint at path (SAVE + .pending): a json header line,
+    the seen url filter bits, then the (domain, urls) pairs of domains as
+    json objects of domain : urls, about chunk_size urls per line.
+    Replaced atomically, so a crash leaves the old one or none. '''
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        header = dict(header, filter_bytes=len(filter_bits))
+        f.write(json.dumps(header).encode("utf-8") + b"\n")
+        f.write(filter_bits)
+        chunk, size = dict(), 0
+        for domain, urls in domains:
+            for start in range(0, len(urls), chunk_size):
+                part = urls[start:start + chunk_size]
+                chunk.setdefault(domain, []).extend(part)
+                size += len(part)
+                if size >= chunk_size:
+                    f.write(json.dumps(chunk).encode("utf-8") + b"\n")
+                    chunk, size = dict(), 0
+        if chunk:
+            f.write(json.dumps(chunk).encode("utf-8") + b"\n")
+    os.replace(tmp_path, path)
+
+
+class PendingCheckpoint(object):
+    ''' Checkpoint read back on start. open() returns None unless it was
+    written for the save file and url rules in expected. The file is
+    deleted once opened: the save file changes as soon as the crawl goes
+    on, so it is only good once. '''
+    def __init__(self, f, header, filter_bits):
+        self.file = f
+        self.header = header
+        self.filter_bits = filter_bits
+
+    @classmethod
+    def open(cls, path, expected):
+        if not os.path.exists(path):
+            return None
+        f = open(path, "rb")
+        os.remove(path)
+        try:
+            header = json.loads(f.readline())
+            if any(header.get(key) != value for key, value in expected.items()):
+                f.close()
+                return None
+            filter_bits = f.read(header["filter_bytes"])
+        except (ValueError, KeyError):
+            f.close()
+            return None
+        return cls(f, header, filter_bits)
+
+    def chunks(self):
+        with self.file:
+            for line in self.file:
+                yield json.loads(line)
+
+
+def _init_filter(url_rules):
+    global _url_filter
+    _url_filter = UrlFilter.from_file(url_rules)
+
+
+def _valid_urls(urls):
+    return group_by_domain(urls, _url_filter)
+
+
+def validate_chunks(chunks, url_rules, processes):
+    ''' Yields the valid urls of each chunk, in order, grouped by domain
+    with group_by_domain. With processes > 0 up to two chunks per process
+    are checked at once in a process pool, so reading the save file and
+    validating overlap. '''
+    if processes <= 0:
+        for urls in chunks:
+            yield group_by_domain(urls, scraper.url_filter)
+        return
+    # spawn rather than fork, the crawler already has threads running
+    with ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_filter, initargs=(url_rules,)) as pool:
+        waiting = deque()
+        for urls in chunks:
+            waiting.append(pool.submit(_valid_urls, urls))
+            if len(waiting) >= 2 * processes:
+                yield waiting.popleft().result()
+        while waiting:
+            yield waiting.popleft().result()
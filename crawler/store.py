@@ -0,0 +1,232 @@
+import os
+import shelve
+import struct
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from itertools import chain
+
+from utils import save_file_exists, SAVE_FILE_SUFFIXES
+from utils.seen import get_urlkey
+
+
+class ShelveStore(object):
+    ''' Keeps urlhash : (url, completed) in a shelve file. '''
+    def __init__(self, path):
+        self.save = shelve.open(path)
+
+    @staticmethod
+    def exists(path):
+        return save_file_exists(path)
+
+    @staticmethod
+    def remove(path):
+        for suffix in SAVE_FILE_SUFFIXES:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    @staticmethod
+    def move(path, new_path):
+        for suffix in SAVE_FILE_SUFFIXES:
+            if os.path.exists(path + suffix):
+                os.replace(path + suffix, new_path + suffix)
+
+    def __len__(self):
+        return len(self.save)
+
+    def __contains__(self, urlhash):
+        return urlhash in self.save
+
+    def is_completed(self, urlhash):
+        entry = self.save.get(urlhash)
+        return entry is not None and entry[1]
+
+    def keys(self):
+        return (get_urlkey(urlhash) for urlhash in self.save.keys())
+
+    def entries(self):
+        # (url, completed) of every url
+        return iter(self.save.values())
+
+    def put(self, urlhash, url, completed):
+        self.save[urlhash] = (url, completed)
+
+    def pending(self):
+        for url, completed in self.save.values():
+            if not completed:
+                yield url
+
+    def sync(self):
+        self.save.sync()
+
+    def close(self):
+        self.save.close()
+
+
+class LogStore(object):
+    ''' Append-only record log with a compact index of url hashes.
+
+    The log at path holds (key, completed, url) records, where key is the
+    first 8 bytes of the urlhash. A completed url gets a second record with
+    an empty url. The index at path + ".idx" is a sorted array of keys and
+    a parallel array of (log offset << 1 | completed), written at
+    checkpoints. On open only the log written after the last checkpoint is
+    replayed, so restart cost does not grow with the crawl. '''
+
+    RECORD = struct.Struct("<QBI")
+    INDEX_HEADER = struct.Struct("<QQ")
+    # checkpoint once this many urls are indexed outside the sorted arrays
+    MIN_CHECKPOINT = 1 << 16
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path + ".idx"
+        self.sorted_keys = array("Q")
+        self.sorted_values = array("Q")
+        # key : value for urls added since the last checkpoint
+        self.recent = dict()
+
+        covered = self._load_index()
+        self.log = open(path, "a+b")
+        self._replay(covered)
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(path)
+
+    @staticmethod
+    def remove(path):
+        os.remove(path)
+        if os.path.exists(path + ".idx"):
+            os.remove(path + ".idx")
+
+    @staticmethod
+    def move(path, new_path):
+        os.replace(path, new_path)
+        if os.path.exists(path + ".idx"):
+            os.replace(path + ".idx", new_path + ".idx")
+
+    def _load_index(self):
+        if not os.path.exists(self.index_path):
+            return 0
+        with open(self.index_path, "rb") as f:
+            count, covered = self.INDEX_HEADER.unpack(f.read(self.INDEX_HEADER.size))
+            self.sorted_keys.fromfile(f, count)
+            self.sorted_values.fromfile(f, count)
+        return covered
+
+    def _replay(self, offset):
+        # apply records written after the checkpoint
+        self.log.seek(offset)
+        while True:
+            header = self.log.read(self.RECORD.size)
+            if len(header) < self.RECORD.size:
+                break
+            key, completed, length = self.RECORD.unpack(header)
+            if len(self.log.read(length)) < length:
+                break
+            if length:
+                self._set(key, offset << 1 | completed)
+            elif completed:
+                self._complete(key)
+            offset += self.RECORD.size + length
+        # drop a record cut short by a crash
+        self.log.truncate(offset)
+        self.log.seek(0, os.SEEK_END)
+
+    def _find(self, key):
+        i = bisect_left(self.sorted_keys, key)
+        if i < len(self.sorted_keys) and self.sorted_keys[i] == key:
+            return i
+        return -1
+
+    def _get(self, key):
+        if key in self.recent:
+            return self.recent[key]
+        i = self._find(key)
+        return self.sorted_values[i] if i >= 0 else None
+
+    def _set(self, key, value):
+        i = self._find(key)
+        if i >= 0:
+            self.sorted_values[i] = value
+        else:
+            self.recent[key] = value
+
+    def _complete(self, key):
+        value = self._get(key)
+        if value is not None:
+            self._set(key, value | 1)
+
+    def __len__(self):
+        return len(self.sorted_keys) + len(self.recent)
+
+    def __contains__(self, urlhash):
+        return self._get(get_urlkey(urlhash)) is not None
+
+    def is_completed(self, urlhash):
+        value = self._get(get_urlkey(urlhash))
+        return value is not None and bool(value & 1)
+
+    def keys(self):
+        # the urls in recent now, it may grow while the keys are read
+        return chain(self.sorted_keys, list(self.recent))
+
+    def _read(self, values):
+        # (url, completed) of index values, read in log order so the reads
+        # are sequential
+        offsets = sorted(value >> 1 for value in values)
+        self.log.flush()
+        with open(self.path, "rb") as f:
+            for offset in offsets:
+                f.seek(offset)
+                key, completed, length = self.RECORD.unpack(f.read(self.RECORD.size))
+                yield f.read(length).decode("utf-8"), self._get(key) & 1 == 1
+
+    def entries(self):
+        return self._read(chain(self.sorted_values, self.recent.values()))
+
+    def put(self, urlhash, url, completed):
+        key = get_urlkey(urlhash)
+        value = self._get(key)
+        if value is None:
+            data = url.encode("utf-8")
+            offset = self.log.tell()
+            self.log.write(self.RECORD.pack(key, completed, len(data)) + data)
+            self._set(key, offset << 1 | completed)
+        elif completed and not value & 1:
+            self.log.write(self.RECORD.pack(key, True, 0))
+            self._set(key, value | 1)
+
+    def pending(self):
+        values = chain(self.sorted_values, self.recent.values())
+        for url, completed in self._read(value for value in values if not value & 1):
+            yield url
+
+    def sync(self):
+        self.log.flush()
+        os.fsync(self.log.fileno())
+        if len(self.recent) >= max(self.MIN_CHECKPOINT, len(self.sorted_keys)):
+            self.checkpoint()
+
+    def checkpoint(self):
+        ''' Merges recent urls into the sorted arrays and writes the index. '''
+        self.log.flush()
+        keys = array("Q")
+        values = array("Q")
+        for key, value in merge(zip(self.sorted_keys, self.sorted_values), sorted(self.recent.items())):
+            keys.append(key)
+            values.append(value)
+        self.sorted_keys, self.sorted_values = keys, values
+        self.recent = dict()
+
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.INDEX_HEADER.pack(len(keys), self.log.tell()))
+            keys.tofile(f)
+            values.tofile(f)
+        os.replace(tmp_path, self.index_path)
+
+    def close(self):
+        self.checkpoint()
+        self.log.close()
@@ -0,0 +1,157 @@
+import os
+import re
+import json
+from threading import Lock
+from collections import defaultdict, Counter
+from urllib.parse import urlparse, parse_qsl
+from utils import get_logger
+
+DIGITS = re.compile(r"\d+")
+
+
+def get_template(parsed):
+    # host + path with numbers replaced, + sorted query parameter names,
+    # so /events/2019/05/12?page=3 and /events/2020/01/01?page=9 share one
+    path = DIGITS.sub("#", parsed.path.lower())
+    keys = sorted({key for key, value in parse_qsl(parsed.query, keep_blank_values=True)})
+    return f"{parsed.netloc.lower()}{path}?{'&'.join(keys)}"
+
+
+class TrapDetector(object):
+    ''' Spots crawler traps (calendars, infinitely deep or repeating paths,
+    query parameters with endless values, templates of near duplicate pages)
+    from the urls the frontier discovers and the pages the scraper parses.
+
+    Urls too deep or repeating a path segment are skipped. Templates and
+    query parameters with too many urls or values are throttled, as big
+    but legitimate sites look the same, and only blocked once their pages
+    turn out to be near duplicates. Every decision is logged and saved in
+    path, so it survives restarts. '''
+    def __init__(self, config, path, fresh):
+        self.logger = get_logger("TRAPS")
+        self.config = config
+        self.path = path
+        self.lock = Lock()
+
+        # template : urls discovered
+        self.template_urls = Counter()
+        # (template, query parameter) : distinct values seen, kept up to the limit
+        self.query_values = defaultdict(set)
+        # template : [pages parsed, near duplicate pages]
+        self.template_pages = defaultdict(lambda: [0, 0])
+        # pattern : reason, pattern is a template or "template#parameter"
+        self.blocked = dict()
+        self.throttled = dict()
+        # template : new urls of a throttled pattern, one in
+        # config.trap_throttle of them is allowed
+        self.throttled_urls = Counter()
+
+        if fresh and os.path.exists(path):
+            os.remove(path)
+        elif os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                saved = json.load(f)
+            self.blocked, self.throttled = saved["blocked"], saved["throttled"]
+            self.logger.info(
+                f"Loaded {len(self.blocked)} blocked and {len(self.throttled)} "
+                f"throttled trap patterns.")
+
+    def _save(self):
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"blocked": self.blocked, "throttled": self.throttled}, f, indent=1)
+        os.replace(self.path + ".tmp", self.path)
+
+    def _block(self, pattern, reason):
+        self.blocked[pattern] = reason
+        self.logger.info(f"Blocking {pattern}: {reason}.")
+        self._save()
+
+    def _throttle(self, pattern, reason):
+        self.throttled[pattern] = reason
+        self.logger.info(
+            f"Throttling {pattern} to one in {self.config.trap_throttle} urls: {reason}.")
+        self._save()
+
+    def _blocked_reason(self, template, params):
+        if template in self.blocked:
+            return self.blocked[template]
+        for key, value in params:
+            if f"{template}#{key}" in self.blocked:
+                return self.blocked[f"{template}#{key}"]
+        return None
+
+    def is_blocked(self, url):
+        parsed = urlparse(url)
+        params = parse_qsl(parsed.query, keep_blank_values=True)
+        with self.lock:
+            return self._blocked_reason(get_template(parsed), params) is not None
+
+    def allow(self, url):
+        ''' Checks a newly discovered url and counts it towards its patterns.
+        Returns False if it looks like part of a trap. '''
+        parsed = urlparse(url)
+        segments = [segment for segment in parsed.path.lower().split("/") if segment]
+        if len(segments) > self.config.trap_max_depth:
+            self.logger.info(
+                f"Skipping {url}: more than {self.config.trap_max_depth} path segments.")
+            return False
+        if segments:
+            segment, repeats = Counter(segments).most_common(1)[0]
+            if repeats > self.config.trap_max_repeats:
+                self.logger.info(f"Skipping {url}: {segment} repeated {repeats} times.")
+                return False
+
+        template = get_template(parsed)
+        params = parse_qsl(parsed.query, keep_blank_values=True)
+        with self.lock:
+            if self._blocked_reason(template, params):
+                return False
+
+            self.template_urls[template] += 1
+            if (self.template_urls[template] > self.config.trap_max_template_urls
+                    and template not in self.throttled):
+                self._throttle(
+                    template, f"more than {self.config.trap_max_template_urls} urls")
+
+            throttled = template in self.throttled
+            for key, value in params:
+                pattern = f"{template}#{key}"
+                if pattern in self.throttled:
+                    throttled = True
+                    continue
+                values = self.query_values[(template, key)]
+                values.add(value)
+                if len(values) > self.config.trap_max_query_values:
+                    self._throttle(
+                        pattern, f"more than {self.config.trap_max_query_values} values of {key}")
+                    del self.query_values[(template, key)]
+                    throttled = True
+            if throttled:
+                self.throttled_urls[template] += 1
+                return (self.throttled_urls[template] - 1) % self.config.trap_throttle == 0
+        return True
+
+    def duplicate_rate(self, url):
+        # share of the parsed pages of url's template that were near duplicates
+        template = get_template(urlparse(url))
+        with self.lock:
+            if template in self.blocked:
+                return 1.0
+            pages = self.template_pages.get(template)
+            return pages[1] / pages[0] if pages else 0.0
+
+    def record_page(self, url, duplicate):
+        ''' Called by the scraper for every parsed page, blocks templates
+        whose pages are mostly near duplicates, throttled or not. '''
+        template = get_template(urlparse(url))
+        with self.lock:
+            if template in self.blocked:
+                return
+            pages = self.template_pages[template]
+            pages[0] += 1
+            pages[1] += duplicate
+            if (pages[0] >= self.config.trap_min_pages
+                    and pages[1] / pages[0] >= self.config.trap_duplicate_rate):
+                self._block(
+                    template, f"{pages[1]} of {pages[0]} pages are near duplicates")
+                del self.template_pages[template]
@@ -2,7 +2,7 @@ from threading import Thread
 
 from inspect import getsource
 from utils.download import download
-from utils import get_logger
+from utils import get_logger, metrics
 import scraper
 import time
 
@@ -23,14 +23,22 @@ class Worker(Thread):
             if not tbd_url:
                 self.logger.info("Frontier is empty. Stopping Crawler.")
                 break
-            resp = download(tbd_url, self.config, self.logger)
+            with metrics.timer("download"):
+                resp = download(tbd_url, self.config, self.logger)
+            metrics.count("crawler_pages_downloaded_total")
             self.logger.info(
                 f"Downloaded {tbd_url}, status <{resp.status}>, "
                 f"using cache {self.config.cache_server}.")
-            scraped_urls = scraper.scraper(tbd_url, resp)
-            for scraped_url in scraped_urls:
-                self.frontier.add_url(scraped_url)
-            self.frontier.mark_url_complete(tbd_url)
+            if resp.status is None:
+                # the cache server did not reply, try again later
+                self.frontier.requeue_url(tbd_url)
+                continue
+            with metrics.timer("scrape"):
+                scraped_urls = scraper.scraper(tbd_url, resp)
+            with metrics.timer("frontier_update"):
+                for scraped_url in scraped_urls:
+                    self.frontier.add_url(scraped_url)
+                self.frontier.mark_url_complete(tbd_url)
             
             # time.sleep(self.config.time_delay)
             # frontier enforces time delay
\ No newline at end of file
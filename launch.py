@@ -4,14 +4,43 @@ from argparse import ArgumentParser
 from utils.server_registration import get_cache_server
 from utils.config import Config
 from crawler import Crawler
+from crawler.frontier import Frontier, LogFrontier
+from crawler.worker import Worker
+from crawler.async_worker import AsyncWorker
+from crawler.distributed import PartitionedFrontier, PartitionedLogFrontier
 
 
-def main(config_file, restart):
+def main(config_file, restart, node_id, node_count, cache_server=None):
     cparser = ConfigParser()
     cparser.read(config_file)
     config = Config(cparser)
-    config.cache_server = get_cache_server(config, restart)
-    crawler = Crawler(config, restart)
+    if node_count > 1:
+        assert 0 <= node_id < node_count, "node_id should be in [0, node_count)"
+        config.node_id = node_id
+        config.node_count = node_count
+        # every node checkpoints its own partition
+        config.save_file = f"{config.save_file}.{node_id}"
+        # and serves and snapshots its own metrics
+        if config.metrics_port:
+            config.metrics_port += node_id
+        if config.metrics_snapshot_file:
+            config.metrics_snapshot_file = f"{config.metrics_snapshot_file}.{node_id}"
+    if cache_server:
+        # a local stand-in such as utils/replay.py, no registration needed
+        host, port = cache_server.rsplit(":", 1)
+        config.cache_server = (host, int(port))
+    else:
+        config.cache_server = get_cache_server(config, restart)
+    if node_count > 1:
+        frontier_factory = (
+            PartitionedLogFrontier if config.frontier_store == "log"
+            else PartitionedFrontier)
+    else:
+        frontier_factory = LogFrontier if config.frontier_store == "log" else Frontier
+    worker_factory = AsyncWorker if config.worker == "async" else Worker
+    crawler = Crawler(
+        config, restart, frontier_factory=frontier_factory,
+        worker_factory=worker_factory)
     crawler.start()
 
     #crawler.frontier.print_crawl_stats()
@@ -22,5 +51,8 @@ if __name__ == "__main__":
     parser = ArgumentParser()
     parser.add_argument("--restart", action="store_true", default=False)
     parser.add_argument("--config_file", type=str, default="config.ini")
+    parser.add_argument("--node_id", type=int, default=0)
+    parser.add_argument("--node_count", type=int, default=1)
+    parser.add_argument("--cache_server", type=str, default=None, help="host:port")
     args = parser.parse_args()
-    main(args.config_file, args.restart)
+    main(args.config_file, args.restart, args.node_id, args.node_count, args.cache_server)
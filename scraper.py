@@ -1,13 +1,26 @@
+import os
 import re
-from urllib.parse import urlparse, urljoin, urldefrag
-from bs4 import BeautifulSoup
+from urllib.parse import urljoin, urldefrag
 import random
 import hashlib
-from collections import defaultdict
+from collections import Counter
+import numpy as np
 from nltk.stem import PorterStemmer
 from threading import RLock
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+from utils import get_urlhash, save_file_exists, metrics
+from utils.seen import SeenSet, get_urlkey
+from utils.dedup import NearDuplicateIndex, ChecksumIndex, content_checksum
+from utils.url_filter import UrlFilter
+from utils.canonical import Canonicalizer
+from utils.stats import CrawlStats
+from utils.extract import EXTRACTORS
 
 stemmer = PorterStemmer()
+STEM_CACHE_SIZE = 200000
+WORD_PATTERN = re.compile(r'\w+')
 STOPWORDS = {
     "a", "about", "above", "after", "again",
     "against", "all", "am", "an", "and",
@@ -46,73 +59,136 @@ STOPWORDS = {
     "your", "yours", "yourself", "yourselves",
 }
 
-# (i, 16-bit chunk) : set of hashes with that chunk in the ith pos
-# defaultdict creates empty set for new keys
-simhash_buckets = defaultdict(set)
-visited_urls = set()
+# simhashes of unique pages, replaced with a persisted one by configure()
+near_duplicates = NearDuplicateIndex()
+# checksums of page texts, exact duplicates skip tokenizing and simhashing.
+# Replaced with a persisted one by configure()
+exact_duplicates = ChecksumIndex()
+# pages with more content than this are not parsed, set by configure()
+max_page_size = 2500000
+# name of the utils/extract.py function extract_page uses, set by configure()
+extractor = "soup"
+# called with (url, is near duplicate) for every parsed page
+page_listeners = []
+# process pool for page parsing, created by configure() if PARSE_PROCESSES > 0
+parse_pool = None
+# url hashes already scraped, checked in memory through a Bloom filter.
+# The frontier replaces it with one sized by the SEEN_* settings, whose
+# possible hits it looks up in the save file, so memory stays bounded
+visited_urls = SeenSet(capacity=1000000, error_rate=0.01, max_bytes=16 * 1024 * 1024)
 
-unique_pages = {}
-page_word_counts = {}
-token_counts = {}
+# crawl statistics for the report, replaced with a persisted one by configure()
+stats = CrawlStats()
 
 lock = RLock()
 
+# decide which urls are crawled and how they are spelled, replaced by
+# configure() with the rules file named in config.ini
+default_rules = os.path.join(os.path.dirname(os.path.abspath(__file__)), "url_rules.ini")
+url_filter = UrlFilter.from_file(default_rules)
+canonicalizer = Canonicalizer.from_file(default_rules)
+
+def configure(config, restart):
+    # called by the crawler before it starts, loads the scraper state
+    # saved next to the frontier save file
+    global near_duplicates, exact_duplicates, parse_pool, max_page_size, url_filter
+    global canonicalizer, stats, extractor
+    url_filter = UrlFilter.from_file(config.url_rules)
+    canonicalizer = Canonicalizer.from_file(config.url_rules)
+    max_page_size = config.max_page_size
+    extractor = config.extractor
+    simhash_file = f"{config.save_file}.simhash"
+    checksum_file = f"{config.save_file}.checksums"
+    stats_file = f"{config.save_file}.stats"
+    if restart or not save_file_exists(config.save_file):
+        for saved_file in (simhash_file, checksum_file, stats_file):
+            if os.path.exists(saved_file):
+                os.remove(saved_file)
+    near_duplicates = NearDuplicateIndex(config.similarity, path=simhash_file)
+    exact_duplicates = ChecksumIndex(checksum_file)
+    stats = CrawlStats(stats_file, config.stats_interval)
+    parse_pool = None
+    if config.parse_processes > 0:
+        # spawn rather than fork, the crawler already has threads running
+        parse_pool = ProcessPoolExecutor(
+            config.parse_processes, mp_context=multiprocessing.get_context("spawn"))
+
+def close():
+    near_duplicates.close()
+    exact_duplicates.close()
+    stats.close()
+    if parse_pool:
+        parse_pool.shutdown()
+
 def scraper(url, resp):
     links = extract_next_links(url, resp)
-    return [link for link in links if is_valid(link)]
+    # one canonical spelling per link, so variants are filtered and queued once
+    links = dict.fromkeys(canonicalizer.canonicalize(link) for link in links)
+    return url_filter.filter(links)
+
+def get_url_key(url):
+    # hash of what identifies url once canonicalized, shared with the frontier
+    return get_urlhash(canonicalizer.key(canonicalizer.canonicalize(url)))
+
+# stems are memoized, most tokens repeat across pages. lru_cache is
+# thread safe, so all workers share it.
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(token):
+    return stemmer.stem(token)
+
+def stem_cache_stats():
+    info = stem.cache_info()
+    lookups = info.hits + info.misses
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize,
+            "hit_rate": info.hits / lookups if lookups else 0.0}
+
+# one pass over the whitespace separated chunks of a page's text.
+# Returns (stemmed tokens, word count), the same as parse_text and
+# len(re.findall(r'\w+', text)) but without scanning the text three times
+def tokenize(chunks):
+    tokens = []
+    word_count = 0
+    for chunk in chunks:
+        if chunk.isalnum():
+            # no punctuation to remove, the common case
+            word_count += 1
+            token = chunk.lower()
+        else:
+            words = WORD_PATTERN.findall(chunk)
+            word_count += len(words)
+            token = "".join(words).lower()
+        if len(token) > 1 and token not in STOPWORDS:
+            tokens.append(stem(token))
+    return tokens, word_count
 
 # removes HTML Tags, punctuation, whitespace, stopwords
 # then stems and returns tokens
 def parse_text(text):
-    only_words = re.sub(r'[^\w\s]', '', text)
+    return tokenize(text.split())[0]
 
-    tokens = only_words.lower().split()
-    remove_stopwords = [t for t in tokens if t not in STOPWORDS and len(t) > 1]
-    stemmed_tokens = [stemmer.stem(t) for t in remove_stopwords]
+# gets b-bit hash of text (b <= 128)
+def simhash(tokens, b=64):
+    counts = Counter(tokens)
+    if not counts:
+        # every vote is 0, so every bit is set
+        return (1 << b) - 1
 
-    return stemmed_tokens
+    # lower b bits of each unique token's md5, as little-endian bytes
+    num_bytes = (b + 7) // 8
+    digests = b"".join(
+        hashlib.md5(token.encode('utf-8')).digest()[:-num_bytes - 1:-1]
+        for token in counts)
+    bits = np.unpackbits(
+        np.frombuffer(digests, dtype=np.uint8).reshape(len(counts), num_bytes),
+        axis=1, bitorder='little')[:, :b]
+
+    # each token votes +count for its set bits and -count for the rest
+    weights = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+    v = 2 * (weights @ bits) - weights.sum()
 
-# gets b-bit hash of text
-def simhash(tokens, b=64):
-    v = [0] * b
-
-    for token in tokens:
-        # get lower b-bits of 128-bit hash on individual token
-        token_hash = int(hashlib.md5(token.encode('utf-8')).hexdigest(), 16)
-
-        # update vector v
-        for i in range(b):
-            bitmask = 1 << i
-            if token_hash & bitmask:
-                v[i] += 1
-            else:
-                v[i] -= 1
-    
     # convert v to binary b-bit fingerprint
-    fingerprint = 0
-    for i in range(b):
-        if v[i] >= 0:
-            fingerprint |= 1 << i
-    
-    return fingerprint
-
-# uses similarity based on hamming distance
-# between 2 simhashes
-def is_near_simhash_duplicate(hash1, b=64):
-    chunks = [(hash1) >> (16*i) & 0xFFFF for i in range(4)]
-
-    for i, chunk in enumerate(chunks):
-        for hash2 in simhash_buckets[(i, chunk)]:
-            num_diff = bin(hash1 ^ hash2).count("1")
-            similarity_score = 1 - num_diff / b
-            if similarity_score >= 0.95:
-                return True
-    return False
-
-def store_simhash_fingerprint(hash):
-    for i in range(4):
-        chunk = (hash >> (16*i) & 0xFFFF)
-        simhash_buckets[(i, chunk)].add(hash)
+    set_bits = np.packbits(v >= 0, bitorder='little')
+    return int.from_bytes(set_bits.tobytes(), 'little')
 
 def extract_next_links(url, resp):
     # Implementation required.
@@ -125,93 +201,103 @@ def extract_next_links(url, resp):
     #         resp.raw_response.content: the content of the page!
     # Return a list with the hyperlinks (as strings) scrapped from resp.raw_response.content
     defrag_url, fragment = urldefrag(url)
+    urlhash = get_url_key(defrag_url)
     with lock:
-        if defrag_url in visited_urls:
+        if urlhash in visited_urls:
             return []
-        visited_urls.add(defrag_url)
+        visited_urls.add(urlhash)
 
     if resp.status != 200 or resp.raw_response == None:
         return []
     
-    file_size_limit = 2500000
-    if len(resp.raw_response.content) > file_size_limit:
+    if len(resp.raw_response.content) > max_page_size:
         return []
 
-    soup = BeautifulSoup(resp.raw_response.content, 'lxml')
+    analysis = None
+    if parse_pool:
+        # one round trip per page, the text stays in the parsing process.
+        # Exact duplicates are tokenized there too, but off this process
+        with metrics.timer("parse"):
+            page = parse_pool.submit(
+                parse_page, url, resp.raw_response.content, extractor).result()
+        if page is None:
+            return []
+        checksum, chunk_count, hyperlinks, analysis = page
+    else:
+        with metrics.timer("extract"):
+            page = extract_page(url, resp.raw_response.content, extractor)
+        if page is None:
+            return []
+        text, checksum, chunk_count, hyperlinks = page
 
-    # remove noise from page content
-    for tag in soup(['header', 'footer', 'nav', 'script', 'style', 'aside']):
-        tag.decompose()
-    
-    text = soup.get_text(separator=' ', strip=True)
-    if len(text.split()) < 20:
+    if exact_duplicates.check_and_add(checksum, chunk_count, get_urlkey(urlhash)):
+        # same text as a page already parsed, it would get the same tokens
+        # and simhash. Counts as a duplicate for trap detection.
+        for listener in page_listeners:
+            listener(defrag_url, True)
         return []
-    words = re.findall(r'\w+', text)
-    page_word_counts[defrag_url] = len(words)
 
-    tokens = parse_text(text)
-    hash = simhash(tokens)
+    if analysis is None:
+        with metrics.timer("analyze"):
+            analysis = analyze_page(text)
+    word_count, token_counts_page, hash = analysis
+    stats.record_word_count(defrag_url, word_count)
 
-    with lock:
-        if is_near_simhash_duplicate(hash):
-            return []
-        store_simhash_fingerprint(hash)
+    with metrics.timer("near_duplicate_check"):
+        duplicate = near_duplicates.check_and_add(hash, get_urlkey(urlhash))
+    for listener in page_listeners:
+        listener(defrag_url, duplicate)
+    if duplicate:
+        return []
 
-        unique_pages[defrag_url] = True
-        for token in tokens:
-            token_counts[token] = token_counts.get(token, 0) + 1
+    stats.record_unique_page(defrag_url, token_counts_page, get_urlkey(urlhash))
 
+    return hyperlinks
+
+# the cpu heavy parts of extract_next_links have no side effects, so they
+# can run in parse_pool. They are split in two so exact duplicates are
+# caught between them, before the page is tokenized.
+
+# Returns (text, checksum of the text, number of words, links),
+# or None if the page has too little text.
+def extract_page(url, content, extractor="soup"):
+    # visible text and link targets, without the page noise
+    text, hrefs = EXTRACTORS[extractor](content)
+    chunks = text.split()
+    if len(chunks) < 20:
+        return None
 
     hyperlinks = []
-    links = soup.find_all('a')
-    for link in links:
-        href = link.get('href')
-        if href:
-            try:
-                combined_url = urljoin(url, href)
-                defrag_url, fragment = urldefrag(combined_url)
-                hyperlinks.append(defrag_url)
-            except ValueError:
-                continue
+    for href in hrefs:
+        try:
+            combined_url = urljoin(url, href)
+            defrag_url, fragment = urldefrag(combined_url)
+            hyperlinks.append(defrag_url)
+        except ValueError:
+            continue
 
-    return hyperlinks
+    return text, content_checksum(chunks), len(chunks), hyperlinks
+
+# Returns (word count, token counts, simhash) of a page's text.
+def analyze_page(text):
+    # only timed here when not in parse_pool, metrics are off in its processes
+    with metrics.timer("tokenize"):
+        tokens, word_count = tokenize(text.split())
+    with metrics.timer("simhash"):
+        hash = simhash(tokens)
+    return word_count, Counter(tokens), hash
+
+# Both in one call, for parse_pool: returns (checksum, number of words,
+# links, analyze_page result), or None if the page has too little text.
+def parse_page(url, content, extractor="soup"):
+    page = extract_page(url, content, extractor)
+    if page is None:
+        return None
+    text, checksum, chunk_count, hyperlinks = page
+    return checksum, chunk_count, hyperlinks, analyze_page(text)
 
 def is_valid(url):
     # Decide whether to crawl this url or not. 
     # If you decide to crawl it, return True; otherwise return False.
-    # There are already some conditions that return False.
-    ignore_list = ["mediamanager.php", "eppstein/pix", "isg.ics.uci.edu/events/", "share=facebook", "share=twitter", "login", "redirect",
-                    "grape.ics.uci.edu/wiki/public/timeline", "grape.ics.uci.edu/wiki/asterix/timeline", "ical=", "fano.ics.uci.edu/ca/rules",
-                    "week", "month", "year", "calendar"]
-    try:
-        parsed = urlparse(url)
-        if parsed.scheme not in set(["http", "https"]):
-            return False
-        netloc = parsed.netloc.lower()
-        path = parsed.path.lower()
-        query = parsed.query.lower()
-        if "grape.ics.uci.edu" in netloc and "action=diff&version=" in query:
-            return False
-        
-        full_url = f"{netloc}{path}{query}".lower()
-        for item in ignore_list:
-            if item in full_url:
-                return False
-
-
-        if not netloc.endswith((".ics.uci.edu", ".cs.uci.edu", ".informatics.uci.edu", ".stat.uci.edu")):
-            return False
-
-        return not re.match(
-            r".*\.(css|js|bmp|gif|jpe?g|ico"
-            + r"|png|tiff?|mid|mp2|mp3|mp4"
-            + r"|wav|avi|mov|mpeg|ram|m4v|mkv|ogg|ogv|pdf"
-            + r"|ps|eps|tex|ppt|pptx|doc|docx|xls|xlsx|names"
-            + r"|data|dat|exe|bz2|tar|msi|bin|7z|psd|dmg|iso"
-            + r"|epub|dll|cnf|tgz|sha1"
-            + r"|thmx|mso|arff|rtf|jar|csv"
-            + r"|rm|smil|wmv|swf|wma|zip|rar|gz)$", parsed.path.lower())
-        
-    except TypeError:
-        print ("TypeError for ", parsed)
-        raise
+    # The rules are in url_rules.ini (or the URL_RULES file in config.ini).
+    return url_filter.is_valid(url)
\ No newline at end of file
@@ -0,0 +1,106 @@
+import time
+import pickle
+import socket
+from threading import Thread, Lock
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import cbor
+import requests
+
+
+class CacheServer(object):
+    ''' Local stand-in for the cache server: answers ?q=url with the cbor
+    reply the crawler expects, for pages made by site(url), which returns
+    the html, a (content, content type) pair or None for a 404. Without
+    content_length the reply is sent until the connection closes, with no
+    Content-Length header. connections counts the tcp connections it
+    accepted and closed those that ended. Use as a context manager. '''
+    def __init__(self, site, content_length=True):
+        self.site = site
+        self.content_length = content_length
+        self.requests = []
+        self.connections = 0
+        self.closed = 0
+        lock = Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                # headers and body are sent apart, don't wait for an ack in between
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with lock:
+                    server.connections += 1
+
+            def finish(self):
+                super().finish()
+                with lock:
+                    server.closed += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = parse_qs(urlparse(self.path).query)["q"][0]
+                server.requests.append(url)
+                content = server.site(url)
+                content_type = "text/html"
+                if isinstance(content, tuple):
+                    content, content_type = content
+                if isinstance(content, str):
+                    content = content.encode("utf-8")
+                resp = requests.Response()
+                resp.url = url
+                resp.status_code = 200 if content is not None else 404
+                resp.headers["Content-Type"] = content_type
+                resp._content = content or b""
+                body = cbor.dumps({
+                    "url": url, "status": resp.status_code, "response": pickle.dumps(resp)})
+                self.send_response(200)
+                if server.content_length:
+                    self.send_header("Content-Length", str(len(body)))
+                else:
+                    self.send_header("Connection", "close")
+                    self.close_connection = True
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # the crawler stopped reading a reply too large
+                    pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.address = self.server.server_address
+
+    def __enter__(self):
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def crawl(frontier, max_pages=1000):
+    ''' What the workers do, in this thread, until the frontier has no
+    urls left. Returns the urls downloaded. '''
+    from utils.download import download
+    import scraper
+
+    fetched = []
+    while len(fetched) < max_pages:
+        url, wait_time = frontier.poll_tbd_url()
+        if url is None:
+            if wait_time is None:
+                break
+            time.sleep(wait_time)
+            continue
+        resp = download(url, frontier.config, frontier.logger)
+        for link in scraper.scraper(url, resp):
+            frontier.add_url(link)
+        frontier.mark_url_complete(url)
+        fetched.append(url)
+    return fetched
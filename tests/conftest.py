@@ -0,0 +1,35 @@
+import os
+import sys
+from configparser import ConfigParser
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from utils.config import Config
+
+
+def make_config(save_file, **settings):
+    # config.ini with the save file moved and settings overridden
+    parser = ConfigParser()
+    parser.read(os.path.join(ROOT, "config.ini"))
+    config = Config(parser)
+    config.save_file = save_file
+    config.url_rules = os.path.join(ROOT, "url_rules.ini")
+    for name, value in settings.items():
+        setattr(config, name, value)
+    return config
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    # the loggers write to Logs/ in the working directory
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def save_file(tmp_path):
+    return str(tmp_path / "frontier.shelve")
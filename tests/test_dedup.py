@@ -0,0 +1,129 @@
+import os
+import random
+from threading import Barrier, Thread
+
+import numpy as np
+import pytest
+
+from utils.dedup import ChecksumIndex, NearDuplicateIndex, RECORD_SIZE, VECTORIZE_MIN
+
+# far apart hashes, none is a near duplicate of another
+HASHES = [0x0F0F0F0F0F0F0F0F, 0xF0F0F0F0F0F0F0F0, 0x00FF00FF00FF00FF, 0xFF00FF00FF00FF00]
+
+
+def open_index(kind, path):
+    return ChecksumIndex(path) if kind == "checksums" else NearDuplicateIndex(path=path)
+
+
+@pytest.mark.parametrize("kind", ["checksums", "simhash"])
+def test_refetched_page_is_not_its_own_duplicate(tmp_path, kind):
+    path = str(tmp_path / kind)
+    index = open_index(kind, path)
+    assert not index.check_and_add(0xABCDEF, url_key=1)
+    index.close()
+
+    # the frontier lost the page's completion in a crash, it is fetched again
+    index = open_index(kind, path)
+    assert not index.check_and_add(0xABCDEF, url_key=1)
+    assert index.check_and_add(0xABCDEF, url_key=2)
+    index.close()
+
+
+@pytest.mark.parametrize("kind", ["checksums", "simhash"])
+def test_torn_record_is_cut_off(tmp_path, kind):
+    path = str(tmp_path / kind)
+    index = open_index(kind, path)
+    for key in range(3):
+        assert not index.check_and_add(HASHES[key], url_key=key + 1)
+    index.close()
+    with open(path, "ab") as f:
+        f.write(b"\x01\x02\x03\x04\x05")
+
+    index = open_index(kind, path)
+    assert len(index) == 3
+    assert index.check_and_add(HASHES[0], url_key=9)
+    assert not index.check_and_add(HASHES[3], url_key=4)
+    index.close()
+    assert os.path.getsize(path) == 4 * RECORD_SIZE
+
+
+def near_copies(count, rng):
+    # simhashes where half are an earlier one with up to 16 bits flipped,
+    # so each threshold has near duplicates right at its distance
+    hashes = []
+    for _ in range(count):
+        if hashes and rng.random() < 0.5:
+            hash = rng.choice(hashes)
+            for bit in rng.sample(range(64), rng.randint(0, 16)):
+                hash ^= 1 << bit
+        else:
+            hash = rng.getrandbits(64)
+        hashes.append(hash)
+    return hashes
+
+
+def bit_counts(x):
+    # ones in each uint64 of x, counted in parallel within each word
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def full_scan(hashes, threshold):
+    # the verdicts of comparing each hash with every one kept before it
+    kept = np.zeros(len(hashes), dtype=np.uint64)
+    count = 0
+    verdicts = []
+    for hash in hashes:
+        distances = bit_counts(kept[:count] ^ np.uint64(hash))
+        duplicate = bool((1 - distances / 64 >= threshold).any())
+        if not duplicate:
+            kept[count] = hash
+            count += 1
+        verdicts.append(duplicate)
+    return verdicts
+
+
+@pytest.mark.parametrize("threshold", [0.95, 0.9, 0.8])
+def test_verdicts_match_a_full_scan(monkeypatch, threshold):
+    hashes = near_copies(20000, random.Random(0))
+    expected = full_scan(hashes, threshold)
+    assert 0 < sum(expected) < len(hashes)
+
+    # buckets compared with numpy from VECTORIZE_MIN hashes on, which at
+    # 0.8 most are, and then from the first
+    for vectorize_min in (VECTORIZE_MIN, 1):
+        monkeypatch.setattr("utils.dedup.VECTORIZE_MIN", vectorize_min)
+        index = NearDuplicateIndex(threshold)
+        assert [index.check_and_add(hash) for hash in hashes] == expected
+        assert len(index) == len(hashes) - sum(expected)
+
+
+def test_concurrent_near_duplicates_are_stored_once():
+    rng = random.Random(0)
+    # 8 variants, each at most a bit off, of 200 random hashes
+    variants = []
+    for group in range(200):
+        hash = rng.getrandbits(64)
+        for _ in range(8):
+            variant = hash
+            for bit in rng.sample(range(64), rng.randint(0, 1)):
+                variant ^= 1 << bit
+            variants.append(variant)
+    rng.shuffle(variants)
+    assert full_scan(variants, 0.95).count(False) == 200
+
+    index = NearDuplicateIndex(0.95, stripes=4)
+    barrier = Barrier(8)
+    results = [None] * 8
+    def add(worker):
+        barrier.wait()
+        results[worker] = [index.check_and_add(hash) for hash in variants[worker::8]]
+    threads = [Thread(target=add, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(result.count(False) for result in results) == 200
+    assert len(index) == 200
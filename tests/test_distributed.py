@@ -0,0 +1,73 @@
+import json
+import os
+import socket
+import time
+from multiprocessing.connection import Client
+
+from conftest import make_config
+from crawler.distributed import PartitionedFrontier, get_owner
+import scraper
+
+
+def free_ports(count):
+    # a base port with count free ports from it
+    while True:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            base = sock.getsockname()[1]
+        try:
+            for port in range(base, base + count):
+                with socket.socket() as sock:
+                    sock.bind(("127.0.0.1", port))
+            return base
+        except OSError:
+            continue
+
+
+def urls_of(node, node_count=2, count=5):
+    urls = (f"https://host{i}.ics.uci.edu/page" for i in range(1000))
+    return [url for url in urls if get_owner(url, node_count) == node][:count]
+
+
+def open_node(save_file, node_id, base_port, **settings):
+    config = make_config(
+        save_file, time_delay=0, seed_urls=[], node_id=node_id, node_count=2,
+        node_base_port=base_port, node_forward_interval=0.1, **settings)
+    scraper.configure(config, True)
+    return PartitionedFrontier(config, True)
+
+
+def test_close_stops_receiving_from_peers(tmp_path):
+    base_port = free_ports(2)
+    node = open_node(str(tmp_path / "node1.shelve"), 1, base_port)
+    peer = Client(("127.0.0.1", base_port + 1), authkey=node.authkey)
+    try:
+        peer.send(urls_of(1))
+        deadline = time.time() + 5
+        while node.received < 5 and time.time() < deadline:
+            time.sleep(0.05)
+        receivers = list(node.receivers.values())
+        assert node.received == 5 and len(receivers) == 1
+        node.close()
+        assert not receivers[0].is_alive()
+        assert node.receivers == {}
+    finally:
+        peer.close()
+        scraper.close()
+
+
+def test_outbox_is_saved_with_the_frontier(tmp_path):
+    base_port = free_ports(2)
+    # node 1 is not running, urls for it wait in the outbox
+    node = open_node(str(tmp_path / "node0.shelve"), 0, base_port)
+    try:
+        urls = urls_of(1)
+        for url in urls:
+            node.add_url(url)
+        node._flush()
+        with open(node.outbox_file, encoding="utf-8") as f:
+            assert json.load(f) == {"1": urls}
+    finally:
+        node.close()
+        scraper.close()
+    assert os.path.exists(node.outbox_file)
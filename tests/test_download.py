@@ -0,0 +1,132 @@
+import asyncio
+import pickle
+import time
+
+import aiohttp
+import pytest
+import requests
+
+from cache_server import CacheServer
+from conftest import make_config
+from utils import download, get_logger
+from utils.response import Response
+
+PAGE = "<html><body>page</body></html>"
+LARGE = b"<html><body>" + b"x" * 1000000 + b"</body></html>"
+IMAGE = (b"\x89PNG\r\n" + b"\x00" * 1000, "image/png")
+
+
+def fetch(config, urls, asynchronous=False):
+    # downloads urls in turn with download, or download_async on one session
+    logger = get_logger("TEST")
+    if not asynchronous:
+        return [download.download(url, config, logger) for url in urls]
+
+    async def fetch_all():
+        async with aiohttp.ClientSession(trace_configs=[download.trace_config()]) as session:
+            return [await download.download_async(url, config, session, logger)
+                    for url in urls]
+    return asyncio.run(fetch_all())
+
+
+@pytest.fixture
+def unpickled(monkeypatch):
+    # cache server replies unpickled by Response
+    calls = []
+    loads = pickle.loads
+    def counted(data):
+        calls.append(len(data))
+        return loads(data)
+    monkeypatch.setattr("utils.response.pickle.loads", counted)
+    return calls
+
+
+@pytest.fixture
+def read_bytes(monkeypatch):
+    # bytes download read from reply bodies
+    chunks = []
+    iter_content = requests.Response.iter_content
+    def counted(self, *args, **kwargs):
+        for chunk in iter_content(self, *args, **kwargs):
+            chunks.append(len(chunk))
+            yield chunk
+    monkeypatch.setattr(requests.Response, "iter_content", counted)
+    return chunks
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_oversized_reply_is_not_read_or_unpickled(save_file, unpickled, read_bytes, asynchronous):
+    before = download.rejected_bytes
+    with CacheServer(lambda url: LARGE) as server:
+        config = make_config(save_file, cache_server=server.address, max_page_size=100000)
+        resp, = fetch(config, ["https://www.ics.uci.edu/large"], asynchronous)
+    assert resp.rejected == f"response larger than {100000 + download.ENVELOPE_OVERHEAD} bytes"
+    assert resp.raw_response is None
+    # Content-Length gave it away, before the body was read
+    assert read_bytes == [] and unpickled == []
+    assert download.rejected_bytes - before > len(LARGE)
+
+
+def test_reply_without_length_is_read_up_to_the_limit(save_file, unpickled, read_bytes):
+    with CacheServer(lambda url: LARGE, content_length=False) as server:
+        config = make_config(save_file, cache_server=server.address, max_page_size=100000)
+        resp, = fetch(config, ["https://www.ics.uci.edu/large"])
+    assert resp.rejected.startswith("response larger than")
+    assert sum(read_bytes) <= 100000 + download.ENVELOPE_OVERHEAD + 64 * 1024
+    assert unpickled == []
+
+
+def test_size_is_checked_before_unpickling(unpickled):
+    page = requests.Response()
+    page._content = LARGE
+    resp = Response(
+        {"url": "https://www.ics.uci.edu/large", "status": 200, "response": pickle.dumps(page)},
+        max_size=100000)
+    assert resp.rejected == "response larger than 100000 bytes"
+    assert resp.raw_response is None and unpickled == []
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_other_content_types_are_rejected(save_file, asynchronous):
+    before = download.rejected_pages["content type image/png"]
+    with CacheServer(lambda url: IMAGE if url.endswith("logo") else PAGE) as server:
+        config = make_config(save_file, cache_server=server.address)
+        image, page = fetch(
+            config, ["https://www.ics.uci.edu/logo", "https://www.ics.uci.edu/page"],
+            asynchronous)
+    assert image.rejected == "content type image/png" and image.raw_response is None
+    assert page.rejected is None and page.raw_response.content == PAGE.encode("utf-8")
+    assert download.rejected_pages["content type image/png"] - before == 1
+
+
+def test_download_stats_count_async_downloads(save_file):
+    urls = [f"https://www.ics.uci.edu/page{i}" for i in range(5)]
+    before = download.download_stats()
+    with CacheServer(lambda url: PAGE) as server:
+        config = make_config(save_file, cache_server=server.address)
+        responses = fetch(config, urls, asynchronous=True)
+    assert [resp.status for resp in responses] == [200] * 5
+    stats = download.download_stats()
+    assert stats["requests"] - before["requests"] == 5
+    # one keep-alive connection for all of them
+    assert stats["connections_opened"] - before["connections_opened"] == 1
+    assert server.connections == 1
+
+
+def test_download_reuses_its_connection(save_file):
+    urls = [f"https://www.ics.uci.edu/page{i}" for i in range(5)]
+    with CacheServer(lambda url: PAGE) as server:
+        config = make_config(save_file, cache_server=server.address)
+        responses = fetch(config, urls)
+        assert [resp.status for resp in responses] == [200] * 5
+        assert server.connections == 1
+
+        download.close()
+        assert download._sessions == []
+        deadline = time.time() + 5
+        while server.closed < 1 and time.time() < deadline:
+            time.sleep(0.01)
+        assert server.closed == 1
+        # a new session after close
+        fetch(config, urls[:1])
+        assert server.connections == 2
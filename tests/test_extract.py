@@ -0,0 +1,60 @@
+import os
+import random
+import warnings
+
+import pytest
+
+from utils.extract import soup_extract, lxml_extract
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "pages")
+
+# pages that UnicodeDammit decoded differently from the lxml builder
+MISDECODED = [
+    b"<p>caf\xe9</p>",
+    b"<p>\x00null</p>",
+    b'<html><head><meta charset="utf-8"></head><body><p>Mu\xf1oz</p></body></html>',
+]
+
+
+@pytest.fixture(autouse=True)
+def quiet():
+    # soup warns about markup that looks like a file name or xml
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        yield
+
+
+@pytest.mark.parametrize("name", sorted(os.listdir(FIXTURES)))
+def test_fixture_pages_match_soup(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        content = f.read()
+    assert lxml_extract(content) == soup_extract(content)
+
+
+@pytest.mark.parametrize("content", MISDECODED)
+def test_misdeclared_encodings_match_soup(content):
+    assert lxml_extract(content) == soup_extract(content)
+
+
+def random_page(rng):
+    pieces = []
+    for _ in range(rng.randrange(1, 30)):
+        kind = rng.random()
+        if kind < 0.3:
+            pieces.append(rng.choice([b"<p>", b"</p>", b"<div>", b"<b>", b"</div>", b"<script>", b"</script>", b"<nav>", b"</nav>"]))
+        elif kind < 0.4:
+            pieces.append(b'<a href="/%d">' % rng.randrange(100))
+        elif kind < 0.5:
+            pieces.append(rng.choice([b'<meta charset="utf-8">', b'<meta charset="latin-1">', b'<meta charset="windows-1252">']))
+        elif kind < 0.7:
+            pieces.append(bytes(rng.randrange(128, 256) for _ in range(rng.randrange(1, 6))))
+        else:
+            pieces.append(rng.choice(["word ", "café ", "日本 ", "naïve "]).encode(rng.choice(["utf-8", "latin-1", "shift_jis"]), "replace"))
+    return b"".join(pieces)
+
+
+def test_random_pages_match_soup():
+    rng = random.Random(15)
+    for _ in range(300):
+        content = random_page(rng)
+        assert lxml_extract(content) == soup_extract(content), content
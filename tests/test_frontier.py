@@ -0,0 +1,299 @@
+import os
+import sys
+import subprocess
+import textwrap
+from threading import Thread
+
+import pytest
+
+from conftest import ROOT, make_config
+from crawler.frontier import Frontier, LogFrontier
+from crawler.store import ShelveStore
+from utils import get_urlhash
+from utils.stats import CrawlStats
+import scraper
+
+FRONTIERS = {"shelve": Frontier, "log": LogFrontier}
+
+
+def open_frontier(save_file, restart, factory=Frontier, **settings):
+    config = make_config(save_file, time_delay=0, seed_urls=[], **settings)
+    scraper.configure(config, restart)
+    return factory(config, restart)
+
+
+def close_frontier(frontier):
+    frontier.close()
+    scraper.close()
+
+
+def pending_urls(frontier):
+    frontier.loader and frontier.loader.join()
+    urls = set()
+    while True:
+        url, wait_time = frontier.poll_tbd_url()
+        if url is None:
+            return urls
+        urls.add(url)
+
+
+def page(i):
+    return f"https://www.ics.uci.edu/page{i}"
+
+
+def crash(save_file, store, script):
+    # runs script against a fresh frontier in a child process that exits
+    # without closing it, like a crash
+    code = textwrap.dedent(f"""
+        import os, sys
+        sys.path[:0] = [{ROOT!r}, {os.path.dirname(__file__)!r}]
+        from test_frontier import FRONTIERS, open_frontier, page
+        frontier = open_frontier({save_file!r}, True, FRONTIERS[{store!r}],
+                                 save_interval=3600, save_batch=10 ** 6)
+    """) + textwrap.dedent(script) + "\nos._exit(0)\n"
+    subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+
+
+@pytest.mark.parametrize("store", FRONTIERS)
+def test_crash_loses_only_unflushed_changes(save_file, store):
+    crash(save_file, store, """
+        for i in range(100):
+            frontier.add_url(page(i))
+        for i in range(50):
+            frontier.mark_url_complete(page(i))
+        frontier._flush()
+        # the window that is lost
+        for i in range(100, 150):
+            frontier.add_url(page(i))
+        for i in range(50, 75):
+            frontier.mark_url_complete(page(i))
+    """)
+    frontier = open_frontier(save_file, False, FRONTIERS[store])
+    try:
+        assert pending_urls(frontier) == {page(i) for i in range(50, 100)}
+        # urls of the lost window are found again
+        frontier.add_url(page(120))
+        frontier.add_url(page(10))
+        assert pending_urls(frontier) == {page(120)}
+    finally:
+        close_frontier(frontier)
+
+
+@pytest.mark.parametrize("store", FRONTIERS)
+def test_crash_after_save_interval_loses_nothing(save_file, store):
+    crash(save_file, store, """
+        import time
+        frontier.config.save_interval = 0.1
+        with frontier.lock:
+            frontier.unsaved_full.notify()
+        for i in range(100):
+            frontier.add_url(page(i))
+        for i in range(30):
+            frontier.mark_url_complete(page(i))
+        time.sleep(1)
+    """)
+    frontier = open_frontier(save_file, False, FRONTIERS[store])
+    try:
+        assert pending_urls(frontier) == {page(i) for i in range(30, 100)}
+    finally:
+        close_frontier(frontier)
+
+
+@pytest.mark.parametrize("store", FRONTIERS)
+def test_urls_are_saved_while_loading(save_file, store, monkeypatch):
+    frontier = open_frontier(save_file, True, FRONTIERS[store])
+    for i in range(10):
+        frontier.add_url(page(i))
+    close_frontier(frontier)
+    # scanned, so the loader reads the save file twice
+    os.remove(f"{save_file}.pending")
+
+    added, saved = [], []
+    saved_chunks = FRONTIERS[store]._saved_chunks
+    def interleaved(self, items):
+        for chunk in saved_chunks(self, items):
+            yield chunk
+            # meanwhile a page is completed, a url found, and both written
+            added.append(page(100 + len(added)))
+            self.mark_url_complete(page(len(added)))
+            self.add_url(added[-1])
+            self._flush()
+            saved.append(self.loading and scraper.get_url_key(added[-1]) in self.save
+                         and self.save.is_completed(scraper.get_url_key(page(len(added)))))
+    monkeypatch.setattr(FRONTIERS[store], "_saved_chunks", interleaved)
+    frontier = open_frontier(save_file, False, FRONTIERS[store], recovery_chunk=1)
+    try:
+        frontier.loader.join()
+        assert not frontier.loading
+        assert saved and all(saved)
+        assert set(added) <= pending_urls(frontier)
+    finally:
+        close_frontier(frontier)
+
+
+def test_saved_url_is_not_added_again(save_file):
+    frontier = open_frontier(save_file, True)
+    try:
+        frontier.add_url(page(1))
+        frontier._flush()
+        # a filter hit is confirmed in the save file
+        frontier.add_url(page(1))
+        assert pending_urls(frontier) == {page(1)}
+        assert frontier.seen.false_positives == 0
+    finally:
+        close_frontier(frontier)
+
+
+def test_mark_url_complete_does_not_read_save_file(save_file, monkeypatch):
+    frontier = open_frontier(save_file, True)
+    try:
+        for i in range(10):
+            frontier.add_url(page(i))
+        frontier._flush()
+        lookups = []
+        monkeypatch.setattr(
+            ShelveStore, "__contains__", lambda store, urlhash: lookups.append(urlhash))
+        for i in range(10):
+            frontier.mark_url_complete(page(i))
+        assert lookups == []
+    finally:
+        close_frontier(frontier)
+
+
+def test_workers_do_not_wait_on_save_file(save_file):
+    frontier = open_frontier(save_file, True)
+    try:
+        frontier.add_url(page(0))
+        frontier._flush()
+        done = []
+
+        def work():
+            frontier.add_url(page(1))
+            url = frontier.get_tbd_url()
+            frontier.mark_url_complete(url)
+            done.append(url)
+
+        # held by a flush writing a batch
+        with frontier.save_lock:
+            worker = Thread(target=work)
+            worker.start()
+            worker.join(5)
+        assert done == [page(0)]
+    finally:
+        close_frontier(frontier)
+
+
+def test_visited_urls_are_sized_from_config_and_checked_in_save_file(save_file):
+    frontier = open_frontier(save_file, True, seen_capacity=5000, seen_error_rate=0.001)
+    try:
+        visited = scraper.visited_urls
+        assert visited.exact is None
+        assert visited.filter.capacity == 5000
+        frontier.add_url(page(1))
+        frontier.add_url(page(2))
+        frontier.mark_url_complete(page(1))
+        visited.add(scraper.get_url_key(page(1)))
+        visited.add(scraper.get_url_key(page(2)))
+        assert scraper.get_url_key(page(1)) in visited
+        frontier._flush()
+        assert scraper.get_url_key(page(1)) in visited
+        # scraped but not completed yet
+        assert scraper.get_url_key(page(2)) not in visited
+    finally:
+        close_frontier(frontier)
+
+
+def variants(i):
+    # ways the links of a site write page i
+    return [
+        f"https://www.ics.uci.edu/page{i}?b=2&a=1",
+        f"https://ics.uci.edu/page{i}?a=1&b=2",
+        f"https://ICS.uci.edu:443/page{i}?a=1&b=2#top",
+        f"https://ics.uci.edu/x/../page{i}?a=1&utm_source=feed&b=2",
+        f"https://ics.uci.edu/./page{i}?sid=42&b=2&a=1",
+        f"https://www.ics.uci.edu/page%7B{i}%7D/../page{i}?a=1&b=2&fbclid=x",
+    ]
+
+
+def test_url_variants_are_queued_once(save_file):
+    frontier = open_frontier(save_file, True)
+    try:
+        for i in range(50):
+            for url in variants(i):
+                frontier.add_url(url)
+        pending = pending_urls(frontier)
+        assert len(pending) == 50
+        assert {scraper.get_url_key(url) for url in pending} == \
+            {scraper.get_url_key(variants(i)[0]) for i in range(50)}
+    finally:
+        close_frontier(frontier)
+
+
+def write_raw_keyed(path, factory):
+    # written like a crawler without canonicalization: hashes of the raw urls
+    old = factory.store_factory(path)
+    for i in range(20):
+        for url in variants(i)[:3]:
+            old.put(get_urlhash(url), url, i < 10 and url.startswith("https://ics"))
+    old.close()
+
+
+@pytest.mark.parametrize("store", FRONTIERS)
+def test_save_file_with_other_keys_is_keyed_again(save_file, store):
+    factory = FRONTIERS[store]
+    write_raw_keyed(save_file, factory)
+
+    frontier = open_frontier(save_file, False, factory)
+    try:
+        # keyed by the loader, not before the frontier starts
+        assert frontier.rekeying and frontier.loader
+        pending = pending_urls(frontier)
+        assert {scraper.get_url_key(url) for url in pending} == \
+            {scraper.get_url_key(variants(i)[0]) for i in range(10, 20)}
+        assert len(frontier.save) == 20
+        # rediscovered variants of completed and pending pages are not queued
+        for i in range(20):
+            frontier.add_url(variants(i)[5])
+        assert pending_urls(frontier) == set()
+    finally:
+        close_frontier(frontier)
+
+    # keyed once, the next start loads it as it is
+    frontier = open_frontier(save_file, False, factory)
+    try:
+        assert not frontier.rekeying
+        assert len(pending_urls(frontier)) == 10
+        assert not factory.store_factory.exists(f"{save_file}.rekey")
+    finally:
+        close_frontier(frontier)
+
+
+@pytest.mark.parametrize("store", FRONTIERS)
+def test_keying_cut_short_is_started_over(save_file, store):
+    factory = FRONTIERS[store]
+    # a crash left the old save file moved aside and a part of the new one
+    write_raw_keyed(f"{save_file}.rekey", factory)
+    partial = factory.store_factory(save_file)
+    partial.put(scraper.get_url_key(variants(15)[0]), variants(15)[0], True)
+    partial.close()
+
+    frontier = open_frontier(save_file, False, factory)
+    try:
+        pending = pending_urls(frontier)
+        assert {scraper.get_url_key(url) for url in pending} == \
+            {scraper.get_url_key(variants(i)[0]) for i in range(10, 20)}
+        assert len(frontier.save) == 20
+    finally:
+        close_frontier(frontier)
+
+
+def test_flush_saves_stats_before_completed_urls(save_file):
+    frontier = open_frontier(save_file, True, stats_interval=3600)
+    frontier.add_url(page(1))
+    url, wait_time = frontier.poll_tbd_url()
+    scraper.stats.record_unique_page(url, {"crawl": 1}, url_key=1)
+    frontier.mark_url_complete(url)
+    frontier._flush()
+    # what a crash now would leave on disk
+    assert CrawlStats(f"{save_file}.stats").get_total_pages() == 1
+    close_frontier(frontier)
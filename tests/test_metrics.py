@@ -0,0 +1,121 @@
+import socket
+import urllib.request
+from urllib.error import HTTPError
+from threading import Condition, Lock, RLock, Thread
+
+import pytest
+
+from conftest import make_config
+from utils import metrics
+
+
+@pytest.fixture
+def config(save_file, monkeypatch):
+    # metrics served on a free port, starting from no metrics at all
+    for name in ("_histograms", "_counters", "_gauges"):
+        monkeypatch.setattr(metrics, name, dict())
+    monkeypatch.setattr(metrics, "_timed_locks", [])
+    monkeypatch.setattr(metrics, "enabled", False)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    config = make_config(save_file, metrics_enabled=True, metrics_port=port,
+                         metrics_snapshot_file="")
+    metrics.configure(config)
+    yield config
+    metrics.close(config)
+
+
+def scrape(config, path="/metrics"):
+    url = f"http://{config.metrics_host}:{config.metrics_port}{path}"
+    with urllib.request.urlopen(url, timeout=5) as resp:
+        return resp.headers["Content-Type"], resp.read().decode("utf-8")
+
+
+def test_metrics_are_served_in_prometheus_text_format(config):
+    for seconds in (0.0002, 0.003, 0.003, 7):
+        metrics._histogram("crawler_stage_seconds", '{stage="parse"}').observe(seconds)
+    metrics.count("crawler_pages_downloaded_total", 3)
+    metrics.gauge("crawler_frontier_queue_depth", lambda: 12)
+    metrics.gauge("crawler_frontier_domain_ready_seconds", lambda: {'a"b': 1.5})
+    metrics.gauge("crawler_broken", lambda: 1 / 0)
+    lock = metrics.timed_lock(Lock(), "frontier")
+    with lock:
+        pass
+
+    content_type, text = scrape(config)
+    assert content_type.startswith("text/plain; version=0.0.4")
+    lines = text.splitlines()
+    samples = dict(line.rsplit(" ", 1) for line in lines if not line.startswith("#"))
+    assert "# TYPE crawler_stage_seconds histogram" in lines
+    buckets = [int(value) for name, value in samples.items()
+               if name.startswith('crawler_stage_seconds_bucket{stage="parse",le=')]
+    assert buckets == sorted(buckets) and len(buckets) == len(metrics.BUCKETS)
+    assert samples['crawler_stage_seconds_bucket{stage="parse",le="0.0025"}'] == "1"
+    assert samples['crawler_stage_seconds_bucket{stage="parse",le="+Inf"}'] == "4"
+    assert samples['crawler_stage_seconds_count{stage="parse"}'] == "4"
+    assert float(samples['crawler_stage_seconds_sum{stage="parse"}']) == pytest.approx(7.0062)
+    assert "# TYPE crawler_pages_downloaded_total counter" in lines
+    assert samples["crawler_pages_downloaded_total"] == "3"
+    assert samples['crawler_lock_acquires_total{lock="frontier"}'] == "1"
+    assert samples['crawler_lock_contended_total{lock="frontier"}'] == "0"
+    assert "# TYPE crawler_frontier_queue_depth gauge" in lines
+    assert samples["crawler_frontier_queue_depth"] == "12"
+    assert samples['crawler_frontier_domain_ready_seconds{key="a\\"b"}'] == "1.5"
+    # a gauge that fails is left out
+    assert not any(line.startswith("crawler_broken") for line in lines)
+
+    with pytest.raises(HTTPError) as error:
+        scrape(config, "/other")
+    assert error.value.code == 404
+
+
+@pytest.mark.parametrize("factory", [Lock, RLock])
+def test_conditions_wait_and_notify_on_a_timed_lock(config, factory):
+    lock = metrics.timed_lock(factory(), "frontier")
+    has_work = Condition(lock)
+    items, taken = [], []
+
+    def consume():
+        for _ in range(100):
+            with has_work:
+                while not items:
+                    has_work.wait(5)
+                taken.append(items.pop())
+
+    consumer = Thread(target=consume)
+    consumer.start()
+    for i in range(100):
+        with has_work:
+            items.append(i)
+            has_work.notify()
+    consumer.join(10)
+    assert sorted(taken) == list(range(100))
+    with has_work:
+        assert not has_work.wait_for(lambda: False, timeout=0.01)
+    # notify checks the lock is held, through the wrapped lock
+    with pytest.raises(RuntimeError):
+        has_work.notify()
+    assert lock.acquires >= 200
+    assert lock.contended <= lock.acquires
+
+
+def test_lock_counts_add_up_across_threads(config):
+    lock = metrics.timed_lock(Lock(), "frontier")
+    taken = [0] * 8
+
+    def work(i):
+        for _ in range(2000):
+            if lock.acquire(blocking=i % 2 == 0):
+                taken[i] += 1
+                lock.release()
+
+    threads = [Thread(target=work, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert lock.acquires == sum(taken)
+    assert sum(taken[::2]) == 8000
+    _, text = scrape(config)
+    assert f'crawler_lock_acquires_total{{lock="frontier"}} {sum(taken)}' in text
@@ -0,0 +1,58 @@
+from conftest import make_config
+from crawler.frontier import Frontier
+import scraper
+
+
+def open_frontier(save_file, priority):
+    config = make_config(save_file, time_delay=0, seed_urls=[], priority=priority)
+    scraper.configure(config, True)
+    return Frontier(config, True)
+
+
+def fetch_order(frontier, count):
+    return [frontier.poll_tbd_url()[0] for _ in range(count)]
+
+
+def test_coverage_prefers_hosts_not_fetched_yet(save_file):
+    frontier = open_frontier(save_file, "coverage")
+    try:
+        for i in range(3):
+            frontier.add_url(f"https://a.ics.uci.edu/{i}")
+        assert fetch_order(frontier, 1) == ["https://a.ics.uci.edu/0"]
+        # queued on a new host after a.ics.uci.edu was fetched from
+        frontier.add_url("https://b.ics.uci.edu/0")
+        assert fetch_order(frontier, 1) == ["https://b.ics.uci.edu/0"]
+    finally:
+        frontier.close()
+        scraper.close()
+
+
+def test_saturation_prefers_hosts_fetched_less(save_file):
+    frontier = open_frontier(save_file, "saturation")
+    try:
+        for i in range(5):
+            frontier.add_url(f"https://a.ics.uci.edu/{i}")
+        fetch_order(frontier, 2)
+        for i in range(3):
+            frontier.add_url(f"https://b.ics.uci.edu/{i}")
+        # b catches up with the two fetches from a first
+        assert fetch_order(frontier, 2) == ["https://b.ics.uci.edu/0", "https://b.ics.uci.edu/1"]
+    finally:
+        frontier.close()
+        scraper.close()
+
+
+def test_waiting_domain_competes_with_a_better_url_queued_meanwhile(save_file):
+    frontier = open_frontier(save_file, "depth")
+    try:
+        frontier.add_url("https://a.ics.uci.edu/1/2/3/4")
+        frontier.add_url("https://b.ics.uci.edu/1/2")
+        assert fetch_order(frontier, 1) == ["https://b.ics.uci.edu/1/2"]
+        # a waits its turn with a depth 4 url, then a shallow one is found
+        frontier.add_url("https://a.ics.uci.edu/1")
+        frontier.add_url("https://b.ics.uci.edu/1/2/3")
+        assert fetch_order(frontier, 3) == [
+            "https://a.ics.uci.edu/1", "https://b.ics.uci.edu/1/2/3", "https://a.ics.uci.edu/1/2/3/4"]
+    finally:
+        frontier.close()
+        scraper.close()
@@ -0,0 +1,63 @@
+import random
+
+from cache_server import CacheServer, crawl
+from conftest import make_config
+from crawler.frontier import Frontier
+from utils import download
+from utils.replay import ReplayArchive, ReplayServer
+import scraper
+
+SEED = "https://www.ics.uci.edu/page0"
+
+
+def site(url):
+    # 30 linked pages of their own words, one missing and one an image
+    number = int(url.rsplit("page", 1)[1])
+    if number == 13:
+        return None
+    if number == 17:
+        return b"\x89PNG\r\n", "image/png"
+    rng = random.Random(number)
+    words = " ".join(f"w{rng.randrange(10 ** 4)}" for _ in range(50 + number))
+    links = "".join(f'<a href="/page{link}">link</a>'
+                    for link in ((number + 1) % 30, number * 7 % 30))
+    return f"<html><body><p>{words}</p>{links}</body></html>"
+
+
+def crawl_with(save_file, cache_server, record_file=""):
+    # the urls a crawl downloaded and the stats it reports
+    config = make_config(
+        save_file, time_delay=0, seed_urls=[SEED], cache_server=cache_server,
+        download_retries=0, record_file=record_file)
+    download.configure(config)
+    scraper.configure(config, True)
+    frontier = Frontier(config, True)
+    try:
+        fetched = crawl(frontier)
+        return (sorted(fetched), scraper.stats.get_total_pages(),
+                scraper.stats.get_longest_page(), scraper.stats.get_top_words(20),
+                scraper.stats.get_subdomains())
+    finally:
+        frontier.close()
+        scraper.close()
+        download.close()
+
+
+def test_replayed_crawl_matches_the_recorded_one(tmp_path):
+    record_file = str(tmp_path / "crawl.replay")
+    with CacheServer(site) as server:
+        recorded = crawl_with(str(tmp_path / "recorded.shelve"), server.address, record_file)
+    fetched = recorded[0]
+    assert len(fetched) == 30 and recorded[1] == 28
+
+    archive = ReplayArchive(record_file)
+    assert sorted(archive.index) == fetched
+    replay = ReplayServer(("127.0.0.1", 0), archive).start()
+    try:
+        replayed = crawl_with(str(tmp_path / "replayed.shelve"), replay.server_address)
+    finally:
+        replay.shutdown()
+        replay.server_close()
+        archive.close()
+    assert replayed == recorded
+    assert replay.requests == len(fetched)
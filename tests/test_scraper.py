@@ -0,0 +1,83 @@
+import pickle
+import random
+
+import pytest
+import requests
+
+from benchmark import baseline_simhash, baseline_tokenize, bench_tokens, bench_words
+from conftest import make_config
+from utils.response import Response
+import scraper
+
+# words, stopwords, numbers, punctuation, underscores and non-ascii letters
+PIECES = ["the", "and", "A", "Crawling", "crawled", "crawler's", "don't", "e-mail",
+          "U.S.A.", "x", "42", "3.14", "_id", "snake_case", "naïve", "Straße", "データ",
+          "²", "½", "!!", "--", "(", "),", "...", "#tag", "@user", "C++", "it’s"]
+SPACES = [" ", "  ", "\n", "\t", "\u00a0", "\u3000"]
+
+
+@pytest.mark.parametrize("b", [7, 16, 64, 128])
+def test_simhash_matches_the_per_token_loop(b):
+    rng = random.Random(b)
+    pages = [[], ["a"], ["a", "a", "b"], ["héllo", "wörld", "データ"]]
+    pages += [bench_tokens(rng.randint(1, 2000), rng, vocabulary=500) for _ in range(50)]
+    for tokens in pages:
+        assert scraper.simhash(tokens, b) == baseline_simhash(tokens, b)
+
+
+def test_tokenize_matches_parse_text_and_word_count():
+    rng = random.Random(0)
+    for _ in range(3000):
+        pieces = []
+        for _ in range(rng.randint(0, 40)):
+            pieces.append("".join(rng.choices(PIECES, k=rng.randint(1, 3))))
+            pieces.append(rng.choice(SPACES))
+        text = "".join(pieces)
+        assert scraper.tokenize(text.split()) == baseline_tokenize(text)
+        assert scraper.parse_text(text) == baseline_tokenize(text)[0]
+
+
+def page_response(url, text, links):
+    resp = requests.Response()
+    resp.url = url
+    resp.status_code = 200
+    resp.headers["Content-Type"] = "text/html"
+    anchors = "".join(f'<a href="{link}">link</a>' for link in links)
+    resp._content = f"<html><body><p>{text}</p>{anchors}</body></html>".encode("utf-8")
+    return Response({"url": url, "status": 200, "response": pickle.dumps(resp)})
+
+
+def parse_pages(save_file, parse_processes, pages, monkeypatch):
+    # links of pages parsed in turn, the crawl stats, and the functions
+    # sent to the parse pool
+    scraper.configure(make_config(save_file, parse_processes=parse_processes), True)
+    monkeypatch.setattr(scraper, "visited_urls", set())
+    submits = []
+    if scraper.parse_pool:
+        submit = scraper.parse_pool.submit
+        def counted(function, *args):
+            submits.append(function)
+            return submit(function, *args)
+        monkeypatch.setattr(scraper.parse_pool, "submit", counted)
+    try:
+        links = [scraper.extract_next_links(url, page_response(url, text, [f"/next{i}"]))
+                 for i, (url, text) in enumerate(pages)]
+        stats = (scraper.stats.get_total_pages(), scraper.stats.get_longest_page(),
+                 scraper.stats.get_top_words(20))
+    finally:
+        scraper.close()
+    return links, stats, submits
+
+
+def test_parse_pool_gives_the_same_results_in_one_round_trip(save_file, monkeypatch):
+    rng = random.Random(0)
+    words = bench_words(2000, rng)
+    texts = [" ".join(rng.choices(words, k=200)) for _ in range(3)]
+    # the last page has the text of the first, an exact duplicate
+    pages = [(f"https://www.ics.uci.edu/page{i}", text) for i, text in enumerate(texts + texts[:1])]
+
+    links, stats, submits = parse_pages(save_file, 0, pages, monkeypatch)
+    assert links == [[f"https://www.ics.uci.edu/next{i}"] for i in range(3)] + [[]]
+    assert stats[0] == 3
+    assert parse_pages(save_file, 1, pages, monkeypatch) == (
+        links, stats, [scraper.parse_page] * 4)
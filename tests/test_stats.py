@@ -0,0 +1,39 @@
+from utils.stats import CrawlStats
+
+
+def test_torn_last_line_is_cut_off(tmp_path):
+    path = str(tmp_path / "frontier.shelve.stats")
+    stats = CrawlStats(path, interval=0)
+    stats.record_unique_page("https://www.ics.uci.edu/a", {"crawl": 2})
+    stats.save()
+    stats.record_unique_page("https://www.ics.uci.edu/b", {"crawl": 1})
+    stats.save()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"pages": 1, "tokens": {"cra')
+
+    stats = CrawlStats(path, interval=0)
+    assert stats.get_total_pages() == 2
+    assert stats.tokens["crawl"] == 3
+    stats.record_unique_page("https://www.ics.uci.edu/c", {"crawl": 1})
+    stats.save()
+    assert CrawlStats(path).get_total_pages() == 3
+
+
+def test_page_fetched_again_after_a_restart_is_counted_once(tmp_path):
+    path = str(tmp_path / "frontier.shelve.stats")
+    stats = CrawlStats(path, interval=3600)
+    stats.record_unique_page("https://www.ics.uci.edu/a", {"crawl": 2}, url_key=1)
+    stats.save()
+
+    # refetched before it was saved as completed
+    stats = CrawlStats(path, interval=3600)
+    stats.record_unique_page("https://www.ics.uci.edu/a", {"crawl": 2}, url_key=1)
+    stats.record_unique_page("https://www.ics.uci.edu/b", {"crawl": 1}, url_key=2)
+    stats.close()
+
+    # the keys are kept when the lines are rewritten as totals
+    stats = CrawlStats(path, interval=3600)
+    stats.record_unique_page("https://www.ics.uci.edu/b", {"crawl": 1}, url_key=2)
+    assert stats.get_total_pages() == 2
+    assert stats.tokens["crawl"] == 3
+    assert stats.get_subdomains() == {"www.ics.uci.edu": 2}
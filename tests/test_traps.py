@@ -0,0 +1,131 @@
+import random
+
+import pytest
+
+from cache_server import CacheServer, crawl
+from conftest import make_config
+from crawler.frontier import Frontier
+import scraper
+
+
+def text(seed, count=100):
+    # words unique to seed, so pages are not near duplicates of each other
+    rng = random.Random(seed)
+    return " ".join(f"w{rng.randrange(10 ** 6)}" for _ in range(count))
+
+
+def page(body, *links):
+    anchors = "".join(f'<a href="{link}">link</a>' for link in links)
+    return f"<html><body><p>{body}</p>{anchors}</body></html>"
+
+
+def schedule(url):
+    # an index of calendar days that all have the same "no events" page
+    if url.endswith("/schedule"):
+        return page(text(url), *(f"/schedule/day-{day}" for day in range(50)))
+    day = int(url.rsplit("-", 1)[1])
+    return page("No events scheduled for this day. " + text("schedule"),
+                f"/schedule/day-{day - 1}", f"/schedule/day-{day + 1}")
+
+
+def search(url):
+    # result pages that ignore the page number
+    if url.endswith("/search"):
+        return page(text(url), *(f"/search?page={number}" for number in range(50)))
+    number = int(url.rsplit("=", 1)[1])
+    return page("Nothing matched your search. " + text("search"), f"/search?page={number + 1}")
+
+
+def repeating(url):
+    return page(text(url), url + "/sub")
+
+
+def deep(url):
+    return page(text(url), url + f"/level{url.count('/')}")
+
+
+def catalogue(url):
+    # a big site of distinct pages sharing one template
+    item = int(url.rsplit("/", 1)[1])
+    return page(text(item), *(f"/item/{next}" for next in range(item + 1, item + 6) if next < 200))
+
+
+@pytest.fixture
+def crawl_site(save_file):
+    frontiers = []
+
+    def crawl_site(site, seed):
+        with CacheServer(site) as server:
+            config = make_config(
+                save_file, time_delay=0, seed_urls=[seed], cache_server=server.address,
+                download_retries=0, trap_max_template_urls=30, trap_max_query_values=10,
+                trap_min_pages=10, trap_throttle=2)
+            scraper.configure(config, True)
+            frontier = Frontier(config, True)
+            frontiers.append(frontier)
+            return frontier, crawl(frontier)
+
+    yield crawl_site
+    for frontier in frontiers:
+        frontier.close()
+    scraper.close()
+
+
+def test_calendar_of_duplicates_is_blocked(crawl_site):
+    frontier, fetched = crawl_site(schedule, "https://cal.ics.uci.edu/schedule")
+    assert "cal.ics.uci.edu/schedule/day-#?" in frontier.traps.blocked
+    assert len(fetched) <= 15
+
+
+def test_query_explosion_of_duplicates_is_blocked(crawl_site):
+    frontier, fetched = crawl_site(search, "https://search.ics.uci.edu/search")
+    assert "search.ics.uci.edu/search?page" in frontier.traps.blocked
+    assert len(fetched) <= 15
+
+
+def test_repeated_segments_are_skipped_and_logged(crawl_site, caplog):
+    frontier, fetched = crawl_site(repeating, "https://loop.ics.uci.edu/docs")
+    assert len(fetched) == 4
+    assert "sub repeated 4 times" in caplog.text
+
+
+def test_deep_paths_are_skipped_and_logged(crawl_site, caplog):
+    frontier, fetched = crawl_site(deep, "https://deep.ics.uci.edu/docs")
+    assert len(fetched) == frontier.config.trap_max_depth
+    assert "more than 12 path segments" in caplog.text
+
+
+def test_big_site_is_throttled_not_blocked(crawl_site):
+    frontier, fetched = crawl_site(catalogue, "https://shop.ics.uci.edu/item/0")
+    template = "shop.ics.uci.edu/item/#?"
+    assert template in frontier.traps.throttled
+    assert template not in frontier.traps.blocked
+    assert len(fetched) > frontier.config.trap_max_template_urls + 10
+
+
+def test_throttled_url_found_again_is_not_counted_again(save_file):
+    config = make_config(
+        save_file, time_delay=0, seed_urls=[], trap_max_template_urls=5, trap_throttle=10)
+    scraper.configure(config, True)
+    frontier = Frontier(config, True)
+    try:
+        for item in range(7):
+            frontier.add_url(f"https://shop.ics.uci.edu/item/{item}")
+        template = "shop.ics.uci.edu/item/#?"
+        assert template in frontier.traps.throttled
+        # item/6 was the second url of the throttled template, it was skipped
+        for _ in range(50):
+            frontier.add_url("https://shop.ics.uci.edu/item/6")
+        assert frontier.traps.template_urls[template] == 7
+        assert frontier.traps.throttled_urls[template] == 2
+        queued = set()
+        while True:
+            url, wait_time = frontier.poll_tbd_url()
+            if url is None:
+                break
+            queued.add(url)
+        assert "https://shop.ics.uci.edu/item/6" not in queued
+        assert len(queued) == 6
+    finally:
+        frontier.close()
+        scraper.close()
@@ -0,0 +1,29 @@
+import random
+from configparser import ConfigParser
+
+from conftest import ROOT
+from benchmark import baseline_is_valid, bench_links
+from utils.url_filter import UrlFilter
+
+
+def test_verdicts_match_the_hard_coded_rules(tmp_path):
+    # url_rules.ini as the hard-coded rules were, "year" has been dropped since
+    rules = ConfigParser()
+    rules.read(f"{ROOT}/url_rules.ini")
+    rules["IGNORE"]["SUBSTRINGS"] += ",year"
+    path = tmp_path / "url_rules.ini"
+    with open(path, "w") as f:
+        rules.write(f)
+    url_filter = UrlFilter.from_file(path)
+
+    urls = bench_links(20000, random.Random(0)) + [
+        # spellings the cheap split has to read as urlparse does
+        "https://www.ics.uci.edu/paper.pdf;jsessionid=1", "https://www.ics.uci.edu/a;b/c.pdf",
+        "https://www.ics.uci.edu/a;b/page", "HTTP://WWW.ICS.UCI.EDU/Index.HTML",
+        "https://www.ics.uci.edu?q=a/b.pdf", "https://www.ics.uci.edu#/x.pdf",
+        "https:www.ics.uci.edu/page", "https:/www.ics.uci.edu/page", "www.ics.uci.edu/page",
+        "https://www.ics.uci.edu", "https://www.ics.uci.edu/page.#x", "mailto:a@ics.uci.edu"]
+    verdicts = [baseline_is_valid(url) for url in urls]
+    assert 0 < sum(verdicts) < len(urls)
+    assert [url_filter.is_valid(url) for url in urls] == verdicts
+    assert url_filter.filter(urls) == [url for url, valid in zip(urls, verdicts) if valid]
@@ -0,0 +1,65 @@
+import socket
+import time
+
+from conftest import make_config
+from crawler.frontier import Frontier
+from crawler.worker import Worker
+import scraper
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def open_frontier(save_file, restart, **settings):
+    settings = dict(dict(time_delay=0, seed_urls=[], requeue_delay=0.2, requeues=1), **settings)
+    config = make_config(save_file, **settings)
+    scraper.configure(config, restart)
+    return Frontier(config, restart)
+
+
+def test_failed_download_is_tried_again_then_left_pending(save_file):
+    url = "https://www.ics.uci.edu/page"
+    frontier = open_frontier(save_file, True)
+    try:
+        frontier.add_url(url)
+        assert frontier.get_tbd_url() == url
+        frontier.requeue_url(url)
+        next_url, wait_time = frontier.poll_tbd_url()
+        assert next_url is None and 0 < wait_time <= 0.2
+        time.sleep(wait_time)
+        assert frontier.get_tbd_url() == url
+        # out of retries for this run
+        frontier.requeue_url(url)
+        assert frontier.poll_tbd_url() == (None, None)
+    finally:
+        frontier.close()
+        scraper.close()
+
+    frontier = open_frontier(save_file, False)
+    try:
+        frontier.loader.join()
+        assert frontier.poll_tbd_url() == (url, None)
+    finally:
+        frontier.close()
+        scraper.close()
+
+
+def test_worker_does_not_complete_url_when_cache_server_is_down(save_file):
+    url = "https://www.ics.uci.edu/page"
+    frontier = open_frontier(
+        save_file, True, requeues=0, download_retries=0, connect_timeout=1,
+        cache_server=("127.0.0.1", unused_port()))
+    try:
+        frontier.add_url(url)
+        Worker(0, frontier.config, frontier).start()
+        deadline = time.time() + 10
+        while not frontier.given_up and time.time() < deadline:
+            time.sleep(0.05)
+        assert frontier.given_up == {url}
+        assert frontier.unsaved[scraper.get_url_key(url)] == (url, False)
+    finally:
+        frontier.close()
+        scraper.close()
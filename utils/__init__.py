@@ -33,3 +33,9 @@ def normalize(url):
     if url.endswith("/"):
         return url.rstrip("/")
     return url
+
+# depending on the dbm module, a shelve save file is the path itself or these files
+SAVE_FILE_SUFFIXES = ("", ".db", ".dat", ".dir", ".bak")
+
+def save_file_exists(path):
+    return any(os.path.exists(path + suffix) for suffix in SAVE_FILE_SUFFIXES)
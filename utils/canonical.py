@@ -0,0 +1,152 @@
+import re
+from hashlib import blake2b
+from configparser import ConfigParser
+from urllib.parse import urlsplit, urlunsplit, unquote
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+PERCENT_ESCAPE = re.compile(r"%[0-9a-fA-F]{2}")
+# characters that never need escaping in a url (RFC 3986 section 2.3)
+UNRESERVED = frozenset(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+# part of Canonicalizer.digest, change it when canonicalize or key change
+KEY_VERSION = 1
+
+
+def _split(value):
+    return [item.strip().lower() for item in value.split(",") if item.strip()]
+
+
+def _normalize_escape(match):
+    # %7e -> ~ for unreserved characters, %2f -> %2F for the rest
+    char = chr(int(match.group(0)[1:], 16))
+    return char if char in UNRESERVED else match.group(0).upper()
+
+
+def remove_dot_segments(path):
+    # resolves "." and ".." segments (RFC 3986 section 5.2.4)
+    segments = path.split("/")
+    output = []
+    for segment in segments:
+        if segment == ".":
+            continue
+        elif segment == "..":
+            if len(output) > 1:
+                output.pop()
+        else:
+            output.append(segment)
+    if segments[-1] in (".", ".."):
+        # "/a/b/.." is the directory "/a/"
+        output.append("")
+    return "/".join(output)
+
+
+class Canonicalizer(object):
+    ''' Rewrites urls to one canonical spelling, built once from the
+    [CANONICAL] and [DROP PARAMS] sections of a rules file (see
+    url_rules.ini), so variants of a page are queued and fetched once.
+
+    The scheme and host are lowercased, default ports, fragments, empty
+    queries and the trailing slash are removed, dot segments are resolved,
+    percent escapes get one spelling, listed query (and ;path) parameters
+    are dropped and the rest are sorted by name. '''
+    def __init__(self, sort_query=True, strip_www=True, strip_trailing_slash=True,
+                 drop_params=None):
+        self.sort_query = sort_query
+        self.strip_www = strip_www
+        self.strip_trailing_slash = strip_trailing_slash
+        # host substring ("*" for every host) : parameter names to drop
+        drop_params = drop_params or {}
+        self.drop_everywhere = frozenset(drop_params.get("*", ()))
+        self.drop_rules = [
+            (host, frozenset(names)) for host, names in drop_params.items() if host != "*"]
+
+    @classmethod
+    def from_file(cls, path):
+        rules = ConfigParser()
+        with open(path, encoding="utf-8") as f:
+            rules.read_file(f)
+        canonical = rules["CANONICAL"]
+        return cls(
+            canonical.getboolean("SORT_QUERY"),
+            canonical.getboolean("STRIP_WWW"),
+            canonical.getboolean("STRIP_TRAILING_SLASH"),
+            {host.lower(): _split(names) for host, names in rules["DROP PARAMS"].items()})
+
+    def _dropped(self, host):
+        dropped = self.drop_everywhere
+        for rule_host, names in self.drop_rules:
+            if rule_host in host:
+                dropped = dropped | names
+        return dropped
+
+    def _params(self, params, separator, dropped):
+        kept = []
+        for param in params.split(separator):
+            if not param:
+                continue
+            name = unquote(param.partition("=")[0]).lower()
+            if name not in dropped:
+                kept.append(param)
+        return kept
+
+    def canonicalize(self, url):
+        ''' Returns the canonical form of url, or url itself if it can't
+        be parsed. Canonical urls are returned unchanged. '''
+        try:
+            parts = urlsplit(url.strip())
+            scheme = parts.scheme.lower()
+            host = parts.hostname or ""
+            port = parts.port
+        except ValueError:
+            return url
+        if scheme not in DEFAULT_PORTS or not host:
+            return url
+
+        netloc = host
+        if ":" in host:
+            # ipv6 address
+            netloc = f"[{host}]"
+        if port is not None and port != DEFAULT_PORTS[scheme]:
+            netloc = f"{netloc}:{port}"
+        if parts.username is not None:
+            userinfo = parts.netloc.rpartition("@")[0]
+            netloc = f"{userinfo}@{netloc}"
+
+        dropped = self._dropped(host)
+        path = PERCENT_ESCAPE.sub(_normalize_escape, parts.path)
+        path, semicolon, path_params = path.partition(";")
+        path = remove_dot_segments(path)
+        if path_params and dropped:
+            path_params = ";".join(self._params(path_params, ";", dropped))
+        if path_params:
+            path = f"{path};{path_params}"
+
+        query = PERCENT_ESCAPE.sub(_normalize_escape, parts.query)
+        params = self._params(query, "&", dropped)
+        if self.sort_query:
+            # by name only, repeated parameters keep their order
+            params.sort(key=lambda param: param.partition("=")[0])
+        query = "&".join(params)
+
+        if self.strip_trailing_slash and not query:
+            # the same rule as utils.normalize
+            path = path.rstrip("/")
+        return urlunsplit((scheme, netloc, path, query, ""))
+
+    def digest(self):
+        ''' Identifies the keys urls get with these rules. A save file
+        written with another digest has to be keyed again. '''
+        rules = (
+            KEY_VERSION, self.sort_query, self.strip_www, self.strip_trailing_slash,
+            sorted(self.drop_everywhere),
+            sorted((host, sorted(names)) for host, names in self.drop_rules))
+        return blake2b(repr(rules).encode("utf-8"), digest_size=16).hexdigest()
+
+    def key(self, url):
+        ''' What a canonical url is identified by in the frontier, pass it
+        to get_urlhash. Hosts with and without "www." are the same site. '''
+        if self.strip_www:
+            scheme, sep, rest = url.partition("://")
+            if rest.startswith("www."):
+                return f"{scheme}://{rest[4:]}"
+        return url
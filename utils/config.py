@@ -8,12 +8,68 @@ class Config(object):
         assert self.user_agent != "DEFAULT AGENT", "Set useragent in config.ini"
         assert re.match(r"^[a-zA-Z0-9_ ,]+$", self.user_agent), "User agent should not have any special characters outside '_', ',' and 'space'"
         self.threads_count = int(config["LOCAL PROPERTIES"]["THREADCOUNT"])
+        self.worker = config["LOCAL PROPERTIES"]["WORKER"].strip().lower()
+        self.async_tasks = int(config["LOCAL PROPERTIES"]["ASYNC_TASKS"])
+        self.stats_interval = float(config["LOCAL PROPERTIES"]["STATS_INTERVAL"])
+        self.parse_processes = int(config["LOCAL PROPERTIES"]["PARSE_PROCESSES"])
         self.save_file = config["LOCAL PROPERTIES"]["SAVE"]
+        self.frontier_store = config["LOCAL PROPERTIES"]["FRONTIER_STORE"].strip().lower()
+        self.save_interval = float(config["LOCAL PROPERTIES"]["SAVE_INTERVAL"])
+        self.save_batch = int(config["LOCAL PROPERTIES"]["SAVE_BATCH"])
+        self.seen_capacity = int(config["LOCAL PROPERTIES"]["SEEN_CAPACITY"])
+        self.seen_error_rate = float(config["LOCAL PROPERTIES"]["SEEN_ERROR_RATE"])
+        self.seen_memory = int(float(config["LOCAL PROPERTIES"]["SEEN_MEMORY_MB"]) * 1024 * 1024)
+        self.recovery_chunk = int(config["LOCAL PROPERTIES"]["RECOVERY_CHUNK"])
+        self.recovery_processes = int(config["LOCAL PROPERTIES"]["RECOVERY_PROCESSES"])
 
         self.host = config["CONNECTION"]["HOST"]
         self.port = int(config["CONNECTION"]["PORT"])
+        self.connect_timeout = float(config["CONNECTION"]["CONNECT_TIMEOUT"])
+        self.read_timeout = float(config["CONNECTION"]["READ_TIMEOUT"])
+        self.download_retries = int(config["CONNECTION"]["RETRIES"])
+        self.download_backoff = float(config["CONNECTION"]["BACKOFF"])
+        self.requeue_delay = float(config["CONNECTION"]["REQUEUE_DELAY"])
+        self.requeues = int(config["CONNECTION"]["REQUEUES"])
+        self.record_file = config["CONNECTION"]["RECORD_FILE"].strip()
 
         self.seed_urls = config["CRAWLER"]["SEEDURL"].split(",")
         self.time_delay = float(config["CRAWLER"]["POLITENESS"])
+        self.url_rules = config["CRAWLER"]["URL_RULES"].strip()
+        self.similarity = float(config["CRAWLER"]["SIMILARITY"])
+        self.extractor = config["CRAWLER"]["EXTRACTOR"].strip().lower()
+        assert self.extractor in ("soup", "lxml"), "EXTRACTOR should be soup or lxml"
+        self.priority = config["CRAWLER"]["PRIORITY"].strip().lower()
+        assert self.priority in (
+            "fifo", "depth", "coverage", "saturation", "duplicates", "combined"), \
+            "PRIORITY should be fifo, depth, coverage, saturation, duplicates or combined"
+        self.max_page_size = int(config["CRAWLER"]["MAX_PAGE_SIZE"])
+        self.content_types = {
+            content_type.strip().lower()
+            for content_type in config["CRAWLER"]["CONTENT_TYPES"].split(",")
+            if content_type.strip()}
+
+        self.trap_max_depth = int(config["TRAPS"]["MAX_PATH_DEPTH"])
+        self.trap_max_repeats = int(config["TRAPS"]["MAX_SEGMENT_REPEATS"])
+        self.trap_max_query_values = int(config["TRAPS"]["MAX_QUERY_VALUES"])
+        self.trap_max_template_urls = int(config["TRAPS"]["MAX_TEMPLATE_URLS"])
+        self.trap_throttle = int(config["TRAPS"]["THROTTLE"])
+        self.trap_duplicate_rate = float(config["TRAPS"]["DUPLICATE_RATE"])
+        self.trap_min_pages = int(config["TRAPS"]["MIN_PAGES"])
+
+        self.node_host = config["DISTRIBUTED"]["HOST"].strip()
+        self.node_base_port = int(config["DISTRIBUTED"]["BASE_PORT"])
+        self.node_authkey = config["DISTRIBUTED"]["AUTHKEY"].strip()
+        self.node_forward_batch = int(config["DISTRIBUTED"]["FORWARD_BATCH"])
+        self.node_forward_interval = float(config["DISTRIBUTED"]["FORWARD_INTERVAL"])
+        self.node_idle_timeout = float(config["DISTRIBUTED"]["IDLE_TIMEOUT"])
+        self.metrics_enabled = config["METRICS"].getboolean("ENABLED")
+        self.metrics_host = config["METRICS"]["HOST"].strip()
+        self.metrics_port = int(config["METRICS"]["PORT"])
+        self.metrics_snapshot_file = config["METRICS"]["SNAPSHOT_FILE"].strip()
+        self.metrics_snapshot_interval = float(config["METRICS"]["SNAPSHOT_INTERVAL"])
+
+        # set by launch.py, a single node crawls everything
+        self.node_id = 0
+        self.node_count = 1
 
         self.cache_server = None
\ No newline at end of file
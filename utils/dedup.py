@@ -0,0 +1,200 @@
+import os
+from array import array
+from hashlib import blake2b
+from threading import Lock
+import numpy as np
+
+# buckets smaller than this are compared in pure python, numpy only pays off
+# once there are enough hashes to compare against
+VECTORIZE_MIN = 32
+# saved fingerprints are (fingerprint, url key) pairs of 64-bit integers
+RECORD_SIZE = 16
+
+
+def content_checksum(chunks):
+    # 64-bit hash of a page's text with whitespace normalized
+    digest = blake2b(" ".join(chunks).encode("utf-8", "surrogatepass"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def open_records(path):
+    ''' Returns the (fingerprint, url key) pairs saved at path and the file
+    opened for appending more. A record torn by a crash is cut off. '''
+    saved = array("Q")
+    if os.path.exists(path):
+        with open(path, "r+b") as f:
+            data = f.read()
+            whole = len(data) - len(data) % RECORD_SIZE
+            if whole < len(data):
+                f.truncate(whole)
+        saved.frombytes(data[:whole])
+    return zip(saved[0::2], saved[1::2]), open(path, "ab")
+
+
+def write_record(f, fingerprint, url_key):
+    f.write(array("Q", (fingerprint, url_key or 0)).tobytes())
+
+
+class ChecksumIndex(object):
+    ''' Exact duplicate check on content checksums, done before a page is
+    tokenized and simhashed. Mirrors, trailing slash variants and session id
+    urls often serve the very same text, and those pages skip that work.
+
+    If path is given, checksums are appended to it and loaded again on
+    startup, with the key of the url they came from. The save file of the
+    frontier is written separately, so after a crash a page may be fetched
+    again: it is not a duplicate of itself. Counts how many pages and words
+    were skipped. '''
+    def __init__(self, path=None):
+        self.checksums = set()
+        # keys of the urls whose checksums are stored
+        self.urls = set()
+        self.lock = Lock()
+        self.pages = 0
+        self.duplicate_pages = 0
+        self.skipped_words = 0
+
+        self.path = path
+        self.file = None
+        if path:
+            saved, self.file = open_records(path)
+            for checksum, url_key in saved:
+                self.checksums.add(checksum)
+                self.urls.add(url_key)
+
+    def __len__(self):
+        return len(self.checksums)
+
+    def check_and_add(self, checksum, word_count=0, url_key=None):
+        ''' Returns True if checksum was seen before from another url than
+        url_key, otherwise stores it and returns False. word_count is the
+        work saved when it is a duplicate. '''
+        with self.lock:
+            self.pages += 1
+            if url_key is not None and url_key in self.urls:
+                # fetched again after a crash
+                return False
+            if checksum in self.checksums:
+                self.duplicate_pages += 1
+                self.skipped_words += word_count
+                return True
+            self.checksums.add(checksum)
+            if url_key is not None:
+                self.urls.add(url_key)
+            if self.file:
+                write_record(self.file, checksum, url_key)
+        return False
+
+    def stats(self):
+        return {
+            "pages": self.pages,
+            "exact_duplicates": self.duplicate_pages,
+            "duplicate_rate": self.duplicate_pages / (self.pages or 1),
+            "skipped_words": self.skipped_words,
+            "checksums": len(self.checksums),
+        }
+
+    def close(self):
+        if self.file:
+            with self.lock:
+                self.file.close()
+                self.file = None
+
+
+class NearDuplicateIndex(object):
+    ''' Finds b-bit simhashes (b <= 64) within a similarity threshold.
+
+    Two hashes are near duplicates when 1 - hamming_distance / b >= threshold,
+    so they differ in at most max_distance bits. The hash is split into
+    max_distance + 1 blocks, and a near duplicate must match at least one of
+    them exactly, so each block gets a table of block value : array of hashes
+    and only those buckets are compared.
+
+    Buckets are guarded by striped locks instead of one global lock. If path
+    is given, stored hashes are appended to it and loaded again on startup
+    with the key of their url, which is then never its own near duplicate
+    (see ChecksumIndex). '''
+    def __init__(self, threshold=0.95, b=64, path=None, stripes=64):
+        self.threshold = threshold
+        self.b = b
+        self.max_distance = max(d for d in range(b + 1) if 1 - d / b >= threshold)
+
+        # (shift, mask) of each block
+        block_count = min(self.max_distance + 1, b)
+        self.blocks = []
+        start = 0
+        for i in range(block_count):
+            width = (b - start) // (block_count - i)
+            self.blocks.append((start, (1 << width) - 1))
+            start += width
+        # one table per block, block value : array of hashes
+        self.tables = [dict() for _ in self.blocks]
+        self.locks = [Lock() for _ in range(stripes)]
+        # keys of the urls whose hashes are stored
+        self.urls = set()
+
+        self.path = path
+        self.file_lock = Lock()
+        self.file = None
+        if path:
+            saved, self.file = open_records(path)
+            for hash, url_key in saved:
+                self._store(hash, self._keys(hash))
+                self.urls.add(url_key)
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.tables[0].values())
+
+    def _keys(self, hash):
+        return [(hash >> shift) & mask for shift, mask in self.blocks]
+
+    def _stripes(self, keys):
+        return sorted({hash((i, key)) % len(self.locks) for i, key in enumerate(keys)})
+
+    def _is_near(self, hash, bucket):
+        if len(bucket) < VECTORIZE_MIN:
+            return any(bin(hash ^ other).count("1") <= self.max_distance for other in bucket)
+        diff = np.frombuffer(bucket, dtype=np.uint64) ^ np.uint64(hash)
+        bit_counts = np.unpackbits(diff.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+        return bool((bit_counts <= self.max_distance).any())
+
+    def _store(self, hash, keys):
+        for table, key in zip(self.tables, keys):
+            bucket = table.get(key)
+            if bucket is None:
+                bucket = table[key] = array("Q")
+            bucket.append(hash)
+
+    def check_and_add(self, hash, url_key=None):
+        ''' Returns True if hash is a near duplicate of a hash stored for
+        another url than url_key, otherwise stores it and returns False. '''
+        if url_key is not None and url_key in self.urls:
+            # fetched again after a crash
+            return False
+        keys = self._keys(hash)
+        locks = [self.locks[i] for i in self._stripes(keys)]
+        # always taken in the same order, so two pages can't deadlock
+        for lock in locks:
+            lock.acquire()
+        try:
+            for table, key in zip(self.tables, keys):
+                bucket = table.get(key)
+                if bucket and self._is_near(hash, bucket):
+                    return True
+            self._store(hash, keys)
+        finally:
+            for lock in reversed(locks):
+                lock.release()
+
+        with self.file_lock:
+            if url_key is not None:
+                self.urls.add(url_key)
+            if self.file:
+                write_record(self.file, hash, url_key)
+        return False
+
+    def close(self):
+        if self.file:
+            with self.file_lock:
+                self.file.close()
+                self.file = None
@@ -1,21 +1,197 @@
 import requests
 import cbor
 import time
+import asyncio
+import aiohttp
+from collections import deque, Counter
+from threading import local, Lock
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from utils.response import Response
+from utils.replay import ReplayArchive
+from utils import metrics
 
-def download(url, config, logger=None):
-    host, port = config.cache_server
-    resp = requests.get(
-        f"http://{host}:{port}/",
-        params=[("q", f"{url}"), ("u", f"{config.user_agent}")])
+# transient cache server errors that are retried with backoff
+RETRY_STATUSES = (502, 503, 504)
+
+# one pooled keep-alive session per worker thread
+_thread_local = local()
+_sessions = []
+_stats_lock = Lock()
+# seconds taken by recent downloads, for latency percentiles
+latencies = deque(maxlen=10000)
+# requests sent and connections opened by the aiohttp sessions, see trace_config
+async_counts = Counter()
+
+# room for the cbor envelope and pickled headers around a page of max_page_size
+ENVELOPE_OVERHEAD = 64 * 1024
+# reason : pages rejected before parsing, and bytes not downloaded or decoded
+rejected_pages = Counter()
+rejected_bytes = 0
+# cache server replies are saved here when RECORD_FILE is set, see utils/replay.py
+archive = None
+
+def configure(config):
+    global archive
+    if config.record_file:
+        archive = ReplayArchive(config.record_file)
+
+def close():
+    global archive, _thread_local
+    if archive is not None:
+        archive.close()
+        archive = None
+    with _stats_lock:
+        for session in _sessions:
+            session.close()
+        _sessions.clear()
+    # a thread that downloads again opens a new session
+    _thread_local = local()
+
+def get_session(config):
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        retry = Retry(
+            total=config.download_retries, backoff_factor=config.download_backoff,
+            status_forcelist=RETRY_STATUSES, allowed_methods=("GET",),
+            raise_on_status=False)
+        # every request goes to the same cache server, so one connection is enough
+        session.mount("http://", HTTPAdapter(
+            pool_connections=1, pool_maxsize=1, max_retries=retry))
+        _thread_local.session = session
+        with _stats_lock:
+            _sessions.append(session)
+    return session
+
+async def _count_request(session, context, params):
+    with _stats_lock:
+        async_counts["requests"] += 1
+
+async def _count_connection(session, context, params):
+    with _stats_lock:
+        async_counts["connections"] += 1
+
+def trace_config():
+    # counts what an aiohttp session sends for download_stats, pass it in
+    # the session's trace_configs
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(_count_request)
+    config.on_connection_create_end.append(_count_connection)
+    return config
+
+def download_stats():
+    # connections opened vs requests sent by all sessions, and latency percentiles
+    with _stats_lock:
+        connections = async_counts["connections"]
+        requests_sent = async_counts["requests"]
+        for session in _sessions:
+            for adapter in session.adapters.values():
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools[key]
+                    connections += pool.num_connections
+                    requests_sent += pool.num_requests
+        samples = sorted(latencies)
+    stats = {
+        "requests": requests_sent, "connections_opened": connections,
+        "rejected_pages": dict(rejected_pages), "rejected_bytes": rejected_bytes}
+    if samples:
+        for percentile in (50, 90, 99):
+            stats[f"p{percentile}_latency"] = samples[(len(samples) - 1) * percentile // 100]
+    return stats
+
+def _reject(url, reason, skipped_bytes, logger):
+    global rejected_bytes
+    with _stats_lock:
+        rejected_pages[reason] += 1
+        rejected_bytes += skipped_bytes
+    logger.info(f"Rejected {url}: {reason}.")
+
+def _finish(url, config, status, content, logger):
+    # decode the cache server reply into a Response
+    if archive is not None and status is not None:
+        archive.record(url, status, content)
     try:
-        if resp and resp.content:
-            return Response(cbor.loads(resp.content))
+        if status < 400 and content:
+            with metrics.timer("decode"):
+                resp = Response(
+                    cbor.loads(content), max_size=config.max_page_size + ENVELOPE_OVERHEAD,
+                    content_types=config.content_types)
+            if resp.rejected:
+                _reject(url, resp.rejected, len(content), logger)
+            return resp
     except (EOFError, ValueError) as e:
         pass
-    logger.error(f"Spacetime Response error {resp} with url {url}.")
+    logger.error(f"Spacetime Response error {status} with url {url}.")
     return Response({
-        "error": f"Spacetime Response error {resp} with url {url}.",
-        "status": resp.status_code,
+        "error": f"Spacetime Response error {status} with url {url}.",
+        "status": status,
         "url": url})
+
+def _too_large(url, config, status, length, logger):
+    reason = f"response larger than {config.max_page_size + ENVELOPE_OVERHEAD} bytes"
+    _reject(url, reason, length, logger)
+    return Response({"url": url, "status": status, "rejected": reason})
+
+def download(url, config, logger=None):
+    host, port = config.cache_server
+    limit = config.max_page_size + ENVELOPE_OVERHEAD
+    start = time.time()
+    try:
+        # stream the body so oversized pages are dropped without reading them
+        with get_session(config).get(
+                f"http://{host}:{port}/",
+                params=[("q", f"{url}"), ("u", f"{config.user_agent}")],
+                timeout=(config.connect_timeout, config.read_timeout),
+                stream=True) as resp:
+            length = int(resp.headers.get("Content-Length") or 0)
+            if length > limit:
+                return _too_large(url, config, resp.status_code, length, logger)
+            content = bytearray()
+            for chunk in resp.iter_content(64 * 1024):
+                content += chunk
+                if len(content) > limit:
+                    return _too_large(url, config, resp.status_code, len(content), logger)
+    except requests.RequestException as e:
+        logger.error(f"Spacetime request failed {e} with url {url}.")
+        return Response({
+            "error": f"Spacetime request failed {e} with url {url}.",
+            "status": None,
+            "url": url})
+    finally:
+        latencies.append(time.time() - start)
+    return _finish(url, config, resp.status_code, bytes(content), logger)
+
+async def download_async(url, config, session, logger=None):
+    # same as download, but through an aiohttp session on an event loop
+    host, port = config.cache_server
+    limit = config.max_page_size + ENVELOPE_OVERHEAD
+    start = time.time()
+    for attempt in range(config.download_retries + 1):
+        try:
+            async with session.get(
+                    f"http://{host}:{port}/",
+                    params=[("q", f"{url}"), ("u", f"{config.user_agent}")]) as resp:
+                status = resp.status
+                if (resp.content_length or 0) > limit:
+                    return _too_large(url, config, status, resp.content_length, logger)
+                content = bytearray()
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    content += chunk
+                    if len(content) > limit:
+                        return _too_large(url, config, status, len(content), logger)
+            if status not in RETRY_STATUSES:
+                break
+            error = f"Spacetime Response error {status} with url {url}."
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            content = status = None
+            error = f"Spacetime request failed {e!r} with url {url}."
+        if attempt < config.download_retries:
+            await asyncio.sleep(config.download_backoff * 2 ** attempt)
+    latencies.append(time.time() - start)
+    if content is None:
+        logger.error(error)
+        return Response({"error": error, "status": None, "url": url})
+    return _finish(url, config, status, bytes(content), logger)
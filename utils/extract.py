@@ -0,0 +1,103 @@
+from bs4 import BeautifulSoup
+from bs4.dammit import EncodingDetector
+from lxml import etree
+
+# page noise that is left out of the text and links
+NOISE_TAGS = frozenset(['header', 'footer', 'nav', 'script', 'style', 'aside'])
+
+
+def soup_extract(content):
+    ''' Returns (visible text, hrefs) of an html page using BeautifulSoup. '''
+    soup = BeautifulSoup(content, 'lxml')
+
+    # remove noise from page content
+    for tag in soup(list(NOISE_TAGS)):
+        tag.decompose()
+
+    text = soup.get_text(separator=' ', strip=True)
+    hrefs = []
+    for link in soup.find_all('a'):
+        href = link.get('href')
+        if href:
+            hrefs.append(href)
+    return text, hrefs
+
+
+class _Collector(object):
+    # lxml parser target that keeps the text and hrefs outside noise tags.
+    # Text between two parser events is one string, like a soup NavigableString.
+    def __init__(self):
+        self.noise_depth = 0
+        # soup leaves <template> strings out of get_text, but not its links
+        self.template_depth = 0
+        self.pieces = []
+        self.strings = []
+        self.hrefs = []
+
+    def _end_string(self):
+        if self.pieces:
+            string = "".join(self.pieces).strip()
+            if string and not self.template_depth:
+                self.strings.append(string)
+            self.pieces = []
+
+    def start(self, tag, attrib):
+        self._end_string()
+        if self.noise_depth:
+            self.noise_depth += 1
+        elif tag in NOISE_TAGS:
+            self.noise_depth = 1
+        elif tag == 'template':
+            self.template_depth += 1
+        elif tag == 'a':
+            href = attrib.get('href')
+            if href:
+                self.hrefs.append(href)
+
+    def end(self, tag):
+        self._end_string()
+        if self.noise_depth:
+            self.noise_depth -= 1
+        elif tag == 'template':
+            self.template_depth -= 1
+
+    def data(self, data):
+        if not self.noise_depth:
+            self.pieces.append(data)
+
+    def comment(self, text):
+        self._end_string()
+
+    def pi(self, target, data=None):
+        self._end_string()
+
+    def doctype(self, *args):
+        self._end_string()
+
+    def close(self):
+        self._end_string()
+        return ' '.join(self.strings), self.hrefs
+
+
+def lxml_extract(content):
+    ''' Same result as soup_extract, collected from lxml parser events in
+    one pass without building a tree. '''
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    # decode the way BeautifulSoup's lxml builder does: lxml decodes the
+    # bytes with the first encoding EncodingDetector suggests that it accepts
+    detector = EncodingDetector(content, is_html=True)
+    for encoding in detector.encodings:
+        try:
+            parser = etree.HTMLParser(target=_Collector(), recover=True, encoding=encoding)
+            parser.feed(detector.markup)
+            return parser.close()
+        except (UnicodeDecodeError, LookupError, etree.ParserError):
+            continue
+    return '', []
+
+
+EXTRACTORS = {
+    "soup": soup_extract,
+    "lxml": lxml_extract,
+}
@@ -0,0 +1,325 @@
+import os
+import json
+import time
+from bisect import bisect_left
+from threading import Thread, Lock, Event
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Crawler instrumentation: stage timings, lock waits, counters and gauges.
+# Disabled unless configure() is called with [METRICS] ENABLED, and then
+# every call below returns right away, so the hot paths can always call them.
+enabled = False
+
+# upper bounds (seconds) of the histogram buckets, the last one is +Inf
+BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, float("inf"))
+
+_lock = Lock()
+# (metric name, labels) : Histogram, labels is the prometheus label string
+_histograms = dict()
+# (metric name, labels) : count
+_counters = dict()
+# metric name : function returning a number, or a dict of label value : number
+_gauges = dict()
+# every _TimedLock, for their acquire counts
+_timed_locks = []
+
+_server = None
+_snapshot_thread = None
+_stop = Event()
+_last_snapshot = None
+
+
+class Histogram(object):
+    def __init__(self):
+        self.lock = Lock()
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        i = bisect_left(BUCKETS, value)
+        with self.lock:
+            self.buckets[i] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q):
+        # upper bound of the bucket holding the q-th observation
+        with self.lock:
+            rank = q * self.count
+            seen = 0
+            for bound, count in zip(BUCKETS, self.buckets):
+                seen += count
+                if count and seen >= rank:
+                    return bound
+        return None
+
+
+class _Timer(object):
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _TimedLock(object):
+    ''' Lock wrapper that counts acquires, how many had to wait, and how
+    long. Condition variables built on it still use the wrapped lock's own
+    wait/notify internals, so it works with threading.Condition. '''
+    def __init__(self, lock, name):
+        self.lock = lock
+        self.labels = f'{{lock="{name}"}}'
+        self.wait_times = _histogram("crawler_lock_wait_seconds", self.labels)
+        # read together under _lock when reported, so changed under it too
+        self.acquires = 0
+        self.contended = 0
+        with _lock:
+            _timed_locks.append(self)
+
+    def acquire(self, blocking=True, timeout=-1):
+        if self.lock.acquire(False):
+            with _lock:
+                self.acquires += 1
+            return True
+        if not blocking:
+            return False
+        start = time.perf_counter()
+        acquired = self.lock.acquire(True, timeout)
+        if acquired:
+            self.wait_times.observe(time.perf_counter() - start)
+            with _lock:
+                self.acquires += 1
+                self.contended += 1
+        return acquired
+
+    def release(self):
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    def __getattr__(self, name):
+        # _is_owned, _release_save, _acquire_restore for Condition
+        return getattr(self.lock, name)
+
+
+def _histogram(name, labels):
+    key = (name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        with _lock:
+            histogram = _histograms.setdefault(key, Histogram())
+    return histogram
+
+
+def timer(stage):
+    ''' with timer("download"): ... records the time spent in a stage. '''
+    if not enabled:
+        return _NULL_TIMER
+    return _Timer(_histogram("crawler_stage_seconds", f'{{stage="{stage}"}}'))
+
+
+def count(name, amount=1, labels=""):
+    if not enabled:
+        return
+    key = (name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def get_count(name, labels=""):
+    with _lock:
+        return _counters.get((name, labels), 0)
+
+
+def gauge(name, callback):
+    ''' Registers a value read when metrics are reported. callback returns
+    a number, or a dict of label value : number for one series each. '''
+    if enabled:
+        with _lock:
+            _gauges[name] = callback
+
+
+def timed_lock(lock, name):
+    # the lock itself when disabled, so taking it costs nothing extra
+    if not enabled:
+        return lock
+    return _TimedLock(lock, name)
+
+
+def _gauge_values():
+    values = dict()
+    with _lock:
+        gauges = list(_gauges.items())
+    for name, callback in gauges:
+        try:
+            values[name] = callback()
+        except Exception:
+            # a gauge should never break reporting
+            values[name] = None
+    return values
+
+
+def _counter_values():
+    with _lock:
+        counters = dict(_counters)
+        for timed in _timed_locks:
+            counters[("crawler_lock_acquires_total", timed.labels)] = timed.acquires
+            counters[("crawler_lock_contended_total", timed.labels)] = timed.contended
+    return counters
+
+
+def prometheus_text():
+    ''' All metrics in the prometheus text exposition format. '''
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+    counters = sorted(_counter_values().items())
+    typed = set()
+    for (name, labels), histogram in histograms:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} histogram")
+        with histogram.lock:
+            buckets = list(histogram.buckets)
+            total, count_ = histogram.sum, histogram.count
+        cumulative = 0
+        for bound, bucket in zip(BUCKETS, buckets):
+            cumulative += bucket
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels[1:-1]}{"," if labels else ""}le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{labels} {total}")
+        lines.append(f"{name}_count{labels} {count_}")
+    for (name, labels), value in counters:
+        if name not in typed:
+            typed.add(name)
+            lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name}{labels} {value}")
+    for name, value in sorted(_gauge_values().items()):
+        if value is None:
+            continue
+        lines.append(f"# TYPE {name} gauge")
+        if isinstance(value, dict):
+            for label, series in value.items():
+                label = str(label).replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{name}{{key="{label}"}} {series}')
+        else:
+            lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    ''' Summary of all metrics as a json-able dict, with pages per second
+    since the previous snapshot. '''
+    global _last_snapshot
+    now = time.time()
+    with _lock:
+        histograms = list(_histograms.items())
+    counters = {f"{name}{labels}": value for (name, labels), value in _counter_values().items()}
+    summary = {"time": now, "counters": counters, "gauges": _gauge_values(), "histograms": {}}
+    for (name, labels), histogram in histograms:
+        summary["histograms"][f"{name}{labels}"] = {
+            "count": histogram.count, "sum": histogram.sum,
+            "p50": histogram.quantile(0.5), "p90": histogram.quantile(0.9),
+            "p99": histogram.quantile(0.99)}
+    pages = counters.get("crawler_pages_downloaded_total", 0)
+    if _last_snapshot:
+        last_time, last_pages = _last_snapshot
+        summary["pages_per_second"] = (pages - last_pages) / max(now - last_time, 1e-9)
+    _last_snapshot = (now, pages)
+    return summary
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _write_snapshot(path):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(snapshot(), default=str) + "\n")
+
+
+def _snapshot_loop(path, interval):
+    while not _stop.wait(interval):
+        _write_snapshot(path)
+
+
+def configure(config):
+    ''' Turns metrics on if config.metrics_enabled, serves them on
+    http://METRICS HOST:PORT/metrics and appends a snapshot to the
+    snapshot file every interval. Called before the frontier is created. '''
+    global enabled, _server, _snapshot_thread
+    enabled = config.metrics_enabled
+    if not enabled:
+        return
+    _stop.clear()
+    if config.metrics_port:
+        _server = ThreadingHTTPServer(
+            (config.metrics_host, config.metrics_port), _MetricsHandler)
+        _server.daemon_threads = True
+        Thread(target=_server.serve_forever, daemon=True).start()
+    if config.metrics_snapshot_file:
+        directory = os.path.dirname(config.metrics_snapshot_file)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        _snapshot_thread = Thread(
+            target=_snapshot_loop,
+            args=(config.metrics_snapshot_file, config.metrics_snapshot_interval),
+            daemon=True)
+        _snapshot_thread.start()
+
+
+def close(config):
+    # final snapshot, then stop serving
+    global _server, _snapshot_thread
+    if not enabled:
+        return
+    _stop.set()
+    if _snapshot_thread:
+        _snapshot_thread.join()
+        _snapshot_thread = None
+        _write_snapshot(config.metrics_snapshot_file)
+    if _server:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
@@ -0,0 +1,154 @@
+import os
+import sys
+import time
+import zlib
+import random
+import struct
+from threading import Lock, Thread
+from argparse import ArgumentParser
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# url length, compressed reply length, http status of the cache server reply
+RECORD = struct.Struct("<IIH")
+
+
+class ReplayArchive(object):
+    ''' Cache server replies (the raw cbor bytes) saved by url in one
+    append-only file: a record header, the url, then the zlib compressed
+    reply. Opening the archive reads only the headers to index it. A record
+    cut short by a crash is dropped. '''
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        # url : (offset of the reply, compressed length, status)
+        self.index = dict()
+        self.file = open(path, "a+b")
+        size = os.path.getsize(path)
+        offset = 0
+        while offset + RECORD.size <= size:
+            url_length, length, status = RECORD.unpack(
+                os.pread(self.file.fileno(), RECORD.size, offset))
+            url_offset = offset + RECORD.size
+            if url_offset + url_length + length > size:
+                break
+            url = os.pread(self.file.fileno(), url_length, url_offset).decode("utf-8")
+            self.index[url] = (url_offset + url_length, length, status)
+            offset = url_offset + url_length + length
+        if offset < size:
+            self.file.truncate(offset)
+        self.file.seek(0, os.SEEK_END)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, url):
+        return url in self.index
+
+    def record(self, url, status, content):
+        encoded = url.encode("utf-8")
+        compressed = zlib.compress(content or b"")
+        with self.lock:
+            offset = self.file.tell()
+            self.file.write(RECORD.pack(len(encoded), len(compressed), status))
+            self.file.write(encoded)
+            self.file.write(compressed)
+            self.file.flush()
+            self.index[url] = (offset + RECORD.size + len(encoded), len(compressed), status)
+
+    def get(self, url):
+        ''' Returns (status, cbor bytes) recorded for url, or None. '''
+        entry = self.index.get(url)
+        if entry is None:
+            return None
+        offset, length, status = entry
+        return status, zlib.decompress(os.pread(self.file.fileno(), length, offset))
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class ReplayServer(ThreadingHTTPServer):
+    ''' Stand-in for the cache server that answers from a ReplayArchive.
+    Each reply is delayed by latency plus up to jitter seconds, and
+    error_rate of the requests get error_status instead. Urls that were
+    not recorded get missing_status. '''
+    daemon_threads = True
+
+    def __init__(self, address, archive, latency=0.0, jitter=0.0,
+                 error_rate=0.0, error_status=503, missing_status=404):
+        super().__init__(address, _ReplayHandler)
+        self.archive = archive
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.missing_status = missing_status
+        self.requests = 0
+
+    def start(self):
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in one write, so the added latency is the only one
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        delay = server.latency + random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        url = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+        reply = server.archive.get(url)
+        if random.random() < server.error_rate:
+            status, body = server.error_status, b""
+        elif reply is None:
+            status, body = server.missing_status, b""
+        else:
+            status, body = reply
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # the crawler hung up, as it does on replies over MAX_PAGE_SIZE
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main(argv=None):
+    parser = ArgumentParser(description="Serve a recorded crawl in place of the cache server.")
+    parser.add_argument("archive", help="RECORD_FILE written by a crawl")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every reply")
+    parser.add_argument("--jitter", type=float, default=0.0, help="up to this many more seconds")
+    parser.add_argument("--error_rate", type=float, default=0.0)
+    parser.add_argument("--error_status", type=int, default=503)
+    parser.add_argument("--missing_status", type=int, default=404)
+    args = parser.parse_args(argv)
+    archive = ReplayArchive(args.archive)
+    server = ReplayServer(
+        (args.host, args.port), archive, args.latency, args.jitter,
+        args.error_rate, args.error_status, args.missing_status)
+    print(f"Replaying {len(archive)} urls on {args.host}:{args.port}, "
+          f"run launch.py --cache_server {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,28 @@
 import pickle
 
 class Response(object):
-    def __init__(self, resp_dict):
+    def __init__(self, resp_dict, max_size=None, content_types=None):
         self.url = resp_dict["url"]
         self.status = resp_dict["status"]
         self.error = resp_dict["error"] if "error" in resp_dict else None
+        # reason the page was dropped before it was parsed, if it was
+        self.rejected = resp_dict["rejected"] if "rejected" in resp_dict else None
+        self.raw_response = None
+        if self.rejected or "response" not in resp_dict:
+            return
+
+        # check the size before paying for unpickling
+        if max_size is not None and len(resp_dict["response"]) > max_size:
+            self.rejected = f"response larger than {max_size} bytes"
+            return
         try:
-            self.raw_response = (
-                pickle.loads(resp_dict["response"])
-                if "response" in resp_dict else
-                None)
+            self.raw_response = pickle.loads(resp_dict["response"])
         except TypeError:
             self.raw_response = None
+
+        headers = getattr(self.raw_response, "headers", None)
+        if content_types and headers:
+            content_type = headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if content_type and content_type not in content_types:
+                self.rejected = f"content type {content_type}"
+                self.raw_response = None
@@ -0,0 +1,115 @@
+import math
+
+
+def get_urlkey(urlhash):
+    # 64-bit key from the first 8 bytes of a get_urlhash digest
+    return int(urlhash[:16], 16)
+
+
+class BloomFilter(object):
+    ''' Bit array sized for capacity keys at error_rate false positives,
+    but never larger than max_bytes. Keys are 64-bit url keys, which are
+    already uniformly distributed, so the k bit positions come from
+    double hashing their two 32-bit halves. '''
+    def __init__(self, capacity, error_rate, max_bytes):
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.size = max(8, min(bits, max_bytes * 8))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        h1 = key & 0xFFFFFFFF
+        h2 = (key >> 32) | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        for pos in self._positions(key):
+            if not self.bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def expected_error_rate(self, count):
+        return (1 - math.exp(-self.hash_count * count / self.size)) ** self.hash_count
+
+
+class SeenSet(object):
+    ''' Set of seen urls that answers most lookups from a Bloom filter.
+
+    Only keys the filter might contain fall through to contains(urlhash),
+    the authoritative store. Without one, an exact set of 64-bit keys is
+    kept instead. Not thread safe, callers hold their own lock. '''
+    def __init__(self, capacity, error_rate, max_bytes, contains=None):
+        self.filter = BloomFilter(capacity, error_rate, max_bytes)
+        self.contains = contains
+        self.exact = set() if contains is None else None
+        self.count = 0
+
+        self.lookups = 0
+        self.filter_misses = 0
+        self.false_positives = 0
+
+    def add_key(self, key):
+        self.filter.add(key)
+        if self.exact is not None:
+            self.exact.add(key)
+        self.count += 1
+
+    def add(self, urlhash):
+        self.add_key(get_urlkey(urlhash))
+
+    def might_contain(self, urlhash):
+        ''' Lookup in the filter alone, for callers that check the store
+        themselves. False means urlhash was never added. Report a True
+        the store did not confirm with false_positive(). '''
+        self.lookups += 1
+        if get_urlkey(urlhash) not in self.filter:
+            self.filter_misses += 1
+            return False
+        return True
+
+    def false_positive(self):
+        self.false_positives += 1
+
+    def __contains__(self, urlhash):
+        if not self.might_contain(urlhash):
+            return False
+        if self.exact is not None:
+            found = get_urlkey(urlhash) in self.exact
+        else:
+            found = self.contains(urlhash)
+        if not found:
+            self.false_positive()
+        return found
+
+    def filter_state(self):
+        # what restore_filter needs to rebuild the filter without the keys
+        return {"size": self.filter.size, "hash_count": self.filter.hash_count,
+                "keys": self.count}, self.filter.bits
+
+    def restore_filter(self, state, bits):
+        ''' Adds the keys of a filter saved with filter_state. Returns False
+        if it was sized differently, then the keys have to be added again. '''
+        if (state["size"], state["hash_count"]) != (self.filter.size, self.filter.hash_count) \
+                or len(bits) != len(self.filter.bits):
+            return False
+        # or-ed in, keys added since start stay
+        merged = int.from_bytes(self.filter.bits, "little") | int.from_bytes(bits, "little")
+        self.filter.bits = bytearray(merged.to_bytes(len(bits), "little"))
+        self.count += state["keys"]
+        return True
+
+    def stats(self):
+        lookups = self.lookups or 1
+        return {
+            "lookups": self.lookups,
+            "answered_by_filter": self.filter_misses / lookups,
+            "false_positive_rate": self.false_positives / lookups,
+            "expected_false_positive_rate": self.filter.expected_error_rate(self.count),
+            "filter_bytes": len(self.filter.bits),
+            "keys": self.count,
+        }
@@ -1,5 +1,5 @@
-import os
 from spacetime import Node
+from utils import save_file_exists
 from utils.pcc_models import Register
 
 def init(df, user_agent, fresh):
@@ -23,4 +23,4 @@ def get_cache_server(config, restart):
     init_node = Node(
         init, Types=[Register], dataframe=(config.host, config.port))
     return init_node.start(
-        config.user_agent, restart or not os.path.exists(config.save_file))
\ No newline at end of file
+        config.user_agent, restart or not save_file_exists(config.save_file))
\ No newline at end of file
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+from heapq import nlargest
+from collections import Counter
+from threading import local, Lock
+from urllib.parse import urlparse
+
+
+class _Shard(object):
+    # counts recorded by one thread since the last merge
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self):
+        self.pages = 0
+        # url keys of the pages counted, saved with the counts
+        self.keys = []
+        self.tokens = Counter()
+        self.subdomains = Counter()
+        self.longest_page = (0, None)
+
+
+class CrawlStats(object):
+    ''' Crawl statistics for the report: unique pages, the longest page,
+    word frequencies and pages per subdomain.
+
+    Each thread counts into its own shard, so recording a page never waits
+    on other threads. Shards are merged into the totals at report time and
+    every interval seconds, when the merged counts are also appended to path
+    as one json line. Loading replays those lines, so stats resume across
+    restarts. The frontier also saves them before it saves urls as
+    completed, and the url keys of the pages counted are saved with them,
+    so a page fetched again after a crash is not counted twice. '''
+    def __init__(self, path=None, interval=30):
+        self.path = path
+        self.interval = interval
+        self.local = local()
+        self.shards = []
+        self.lock = Lock()
+        self.last_save = time.time()
+
+        self.total_pages = 0
+        self.tokens = Counter()
+        self.subdomains = Counter()
+        self.longest_page = (0, None)
+        # url keys of every page counted
+        self.counted = set()
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def _load(self, path):
+        # a line torn by a crash is the last one, it is cut off so the next
+        # save starts on a line of its own
+        with open(path, "r+b") as f:
+            offset = 0
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    counts = json.loads(line) if line.strip() else None
+                except ValueError:
+                    break
+                if counts:
+                    self._add(counts)
+                offset += len(line)
+            f.truncate(offset)
+
+    def _shard(self):
+        shard = getattr(self.local, "shard", None)
+        if shard is None:
+            shard = self.local.shard = _Shard()
+            with self.lock:
+                self.shards.append(shard)
+        return shard
+
+    def _add(self, counts):
+        self.total_pages += counts["pages"]
+        self.counted.update(counts.get("keys", ()))
+        self.tokens.update(counts["tokens"])
+        self.subdomains.update(counts["subdomains"])
+        self.longest_page = max(self.longest_page, tuple(counts["longest_page"]),
+                                key=lambda page: page[0])
+
+    def record_word_count(self, url, word_count):
+        shard = self._shard()
+        with shard.lock:
+            if word_count > shard.longest_page[0]:
+                shard.longest_page = (word_count, url)
+
+    def record_unique_page(self, url, token_counts, url_key=None):
+        if url_key is not None:
+            # the scraper parses a url once per run, so only a page counted
+            # before a restart can be here already
+            if url_key in self.counted:
+                return
+            self.counted.add(url_key)
+        shard = self._shard()
+        with shard.lock:
+            shard.pages += 1
+            if url_key is not None:
+                shard.keys.append(url_key)
+            shard.tokens.update(token_counts)
+            shard.subdomains[urlparse(url).netloc.lower()] += 1
+        if self.path and time.time() - self.last_save > self.interval:
+            self.save()
+
+    def merge(self):
+        ''' Moves every thread's counts into the totals, returns what was moved. '''
+        merged = {"pages": 0, "keys": [], "tokens": Counter(), "subdomains": Counter(),
+                  "longest_page": (0, None)}
+        with self.lock:
+            for shard in self.shards:
+                with shard.lock:
+                    pages, keys, tokens = shard.pages, shard.keys, shard.tokens
+                    subdomains, longest_page = shard.subdomains, shard.longest_page
+                    shard.reset()
+                merged["pages"] += pages
+                merged["keys"].extend(keys)
+                merged["tokens"].update(tokens)
+                merged["subdomains"].update(subdomains)
+                merged["longest_page"] = max(
+                    merged["longest_page"], longest_page, key=lambda page: page[0])
+            self._add(merged)
+        return merged
+
+    def save(self):
+        merged = self.merge()
+        with self.lock:
+            self.last_save = time.time()
+            if self.path and (merged["pages"] or merged["longest_page"][1]):
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(merged) + "\n")
+
+    def close(self):
+        # rewrite the file as a single line with the totals
+        self.merge()
+        if not self.path:
+            return
+        with self.lock:
+            totals = {"pages": self.total_pages, "keys": list(self.counted), "tokens": self.tokens,
+                      "subdomains": self.subdomains, "longest_page": self.longest_page}
+            with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(json.dumps(totals) + "\n")
+            os.replace(self.path + ".tmp", self.path)
+
+    def get_total_pages(self):
+        self.merge()
+        return self.total_pages
+
+    def get_longest_page(self):
+        ''' Returns (url, word count), url is None if no page was recorded. '''
+        self.merge()
+        word_count, url = self.longest_page
+        return url, word_count
+
+    def get_top_words(self, k):
+        self.merge()
+        with self.lock:
+            return nlargest(k, self.tokens.items(), key=lambda item: item[1])
+
+    def get_subdomains(self):
+        self.merge()
+        with self.lock:
+            return dict(self.subdomains)
@@ -0,0 +1,68 @@
+import re
+from configparser import ConfigParser
+
+
+def _split(value):
+    return [item.strip().lower() for item in value.split(",") if item.strip()]
+
+
+class UrlFilter(object):
+    ''' Decides which urls are crawled, built once from a rules file
+    (see url_rules.ini) so each check is a few set lookups and one
+    combined regex search. '''
+    def __init__(self, domain_suffixes, ignore_substrings, extensions, query_rules):
+        self.domain_suffixes = tuple(domain_suffixes)
+        self.ignore = re.compile("|".join(re.escape(item) for item in ignore_substrings)) \
+            if ignore_substrings else None
+        self.extensions = frozenset(extensions)
+        # (host substring, query substrings)
+        self.query_rules = [(host, tuple(values)) for host, values in query_rules.items()]
+
+    @classmethod
+    def from_file(cls, path):
+        rules = ConfigParser()
+        with open(path, encoding="utf-8") as f:
+            rules.read_file(f)
+        return cls(
+            _split(rules["DOMAINS"]["SUFFIXES"]),
+            _split(rules["IGNORE"]["SUBSTRINGS"]),
+            _split(rules["EXTENSIONS"]["SKIP"]),
+            {host.lower(): _split(values) for host, values in rules["QUERY"].items()})
+
+    def is_valid(self, url):
+        try:
+            # split as urlparse would, but with a few partitions of the
+            # lowercased url: parsing cost more than all the rules together
+            scheme, sep, rest = url.lower().partition("://")
+            if not sep or scheme not in ("http", "https"):
+                # without "//" there is no host, which no domain allows
+                return False
+            rest = rest.partition("#")[0]
+            rest, _, query = rest.partition("?")
+            netloc, slash, path = rest.partition("/")
+            path = slash + path
+            if ";" in path:
+                # drop the parameters of the last segment, as urlparse does
+                params = path.find(";", path.rfind("/"))
+                if params >= 0:
+                    path = path[:params]
+
+            for host, values in self.query_rules:
+                if host in netloc and any(value in query for value in values):
+                    return False
+
+            if self.ignore and self.ignore.search(f"{netloc}{path}{query}"):
+                return False
+
+            if not netloc.endswith(self.domain_suffixes):
+                return False
+
+            base, dot, extension = path.rpartition(".")
+            return not (dot and extension in self.extensions)
+
+        except AttributeError:
+            print ("Not a url: ", url)
+            raise
+
+    def filter(self, urls):
+        return [url for url in urls if self.is_valid(url)]